@@ -0,0 +1,133 @@
+"""
+Import-time profile of app startup, built on `python -X importtime`.
+
+Starts a fresh interpreter that imports the website package and, unless --no-app is given,
+builds the app with create_app (offline: SESSION_BACKEND=memory, secrets from the
+environment). Reports the total import time, the most expensive modules by cumulative and
+by self time, the peak RSS of that process, and which of the heavy SDKs that are meant to
+be imported on first use were loaded at startup anyway.
+
+Usage:
+    python benchmarks/import_profile.py [--top 25] [--no-app] [--json] [--fail-on-heavy]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Placeholder credentials so create_app can run without Key Vault
+OFFLINE_ENV = {
+    'SECRETS_SOURCE': 'env',
+    'SESSION_BACKEND': 'memory',
+    'FLASK_SECRET_KEY': 'offline-import-profile-key',
+}
+
+# Imported on first use (see avatar.py, cv_utils.py, ai_call.py, ai_parsing.py); none should load at startup
+DEFERRED_MODULES = (
+    'azure.cognitiveservices.speech',
+    'pdfplumber',
+    'pdfminer',
+    'tiktoken',
+    'bleach',
+    'openai',
+    'azure.search.documents',
+)
+
+CHILD_CODE = """
+import resource, sys
+import website
+if {create_app}:
+    website.create_app(secret_key='offline-import-profile-key', instance_id='import-profile')
+print('MAXRSS_KB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+# import time:       self [us] |  cumulative | imported package
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def run_child(create_app):
+    env = dict(os.environ)
+    for name, value in OFFLINE_ENV.items():
+        env.setdefault(name, value)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_CODE.format(create_app=create_app)],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-4000:])
+        raise SystemExit(f"Import profile run failed with exit code {result.returncode}")
+    return result.stdout, result.stderr
+
+def parse_importtime(stderr):
+    """
+    :return: A list of (module, self_us, cumulative_us, depth), in import order.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            # Each nesting level is indented by two more spaces
+            modules.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return modules
+
+def parse_maxrss(stdout):
+    for line in stdout.splitlines():
+        if line.startswith('MAXRSS_KB'):
+            return int(line.split()[1])
+    return None
+
+def build_report(modules, maxrss_kb, top):
+    loaded = {module for module, _, _, _ in modules}
+    deferred = {}
+    for name in DEFERRED_MODULES:
+        timings = [cumulative for module, _, cumulative, _ in modules if module == name or module.startswith(name + '.')]
+        deferred[name] = {'imported': name in loaded, 'cumulative_ms': round(max(timings) / 1000, 1) if timings else 0}
+    return {
+        'total_ms': round(sum(cumulative for _, _, cumulative, depth in modules if depth == 0) / 1000, 1),
+        'modules': len(modules),
+        'maxrss_mb': round(maxrss_kb / 1024, 1) if maxrss_kb else None,
+        'top_cumulative': [{'module': module, 'ms': round(cumulative / 1000, 1)}
+                           for module, _, cumulative, _ in sorted(modules, key=lambda m: -m[2])[:top]],
+        'top_self': [{'module': module, 'ms': round(self_us / 1000, 1)}
+                     for module, self_us, _, _ in sorted(modules, key=lambda m: -m[1])[:top]],
+        'deferred': deferred,
+    }
+
+def print_report(report):
+    print(f"Imported {report['modules']} modules in {report['total_ms']:.1f} ms, peak RSS {report['maxrss_mb']} MB")
+    print(f"\nTop {len(report['top_cumulative'])} by cumulative time:")
+    for entry in report['top_cumulative']:
+        print(f"  {entry['ms']:9.1f} ms  {entry['module']}")
+    print(f"\nTop {len(report['top_self'])} by self time:")
+    for entry in report['top_self']:
+        print(f"  {entry['ms']:9.1f} ms  {entry['module']}")
+    print("\nModules deferred to first use:")
+    for name, entry in report['deferred'].items():
+        state = f"IMPORTED at startup ({entry['cumulative_ms']:.1f} ms)" if entry['imported'] else "not imported"
+        print(f"  {name:<32} {state}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=25, help='modules to list per table')
+    parser.add_argument('--no-app', action='store_true', help='only import the package, do not call create_app')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--fail-on-heavy', action='store_true',
+                        help='exit with status 1 if any deferred module was imported at startup')
+    args = parser.parse_args()
+
+    stdout, stderr = run_child(create_app=not args.no_app)
+    report = build_report(parse_importtime(stderr), parse_maxrss(stdout), args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.fail_on_heavy and any(entry['imported'] for entry in report['deferred'].values()):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Load generator for the session request path, runnable on a laptop.
+
+Builds the full Flask app with an offline session store (SESSION_BACKEND=memory by default,
+or 'fakeredis' / 'local' for a Redis-compatible server at REDIS_URL) and secrets from the
+environment (SECRETS_SOURCE=env), then drives it through Flask's test client from a number
+of concurrent virtual users. Each user gets a seeded session and repeats a page-like mix of
+session reads, session writes, static files, probes and preflights.
+
+Reports latency percentiles per endpoint, overall throughput and, for the in-process store,
+the number of store round-trips per request.
+
+With --check-near-cache (in-process store only) it first checks that a read-only request
+served from the session near-cache issues no store command at all, and exits with status 1
+if it does.
+
+Usage:
+    python benchmarks/session_load.py [--backend memory] [--users 16] [--iterations 50] [--check-near-cache]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASE_URL = 'https://localhost'
+
+# Placeholder credentials so the AI clients can be constructed; no request here reaches them
+OFFLINE_SECRETS = {
+    'KEY1_AI_US': 'offline',
+    'AI_ENDPOINT_US': 'https://localhost',
+    'STEWARD_SEARCH_API_KEY': 'offline',
+    'FLASK_SECRET_KEY': 'offline-benchmark-key',
+}
+
+# (label, method, path, kwargs) repeated by every virtual user
+REQUEST_MIX = [
+    ('get_avatar', 'GET', '/candidate/get_avatar', {}),
+    ('coach_interactions', 'GET', '/candidate/get_coach_interactions', {}),
+    ('record_usage', 'POST', '/candidate/record_usage', {'json': {'recording_seconds': 2.5}}),
+    ('static', 'GET', '/static/assets/Mindorah.png', {}),
+    ('health', 'GET', '/health', {}),
+    ('preflight', 'OPTIONS', '/candidate/interface', {'headers': {'Origin': 'https://www.mindorah.com',
+                                                                  'Access-Control-Request-Method': 'POST'}}),
+]
+
+def build_app(backend):
+    os.environ['SESSION_BACKEND'] = backend
+    os.environ.setdefault('SECRETS_SOURCE', 'env')
+    for name, value in OFFLINE_SECRETS.items():
+        os.environ.setdefault(name, value)
+
+    from website import create_app
+    return create_app(secret_key=os.environ['FLASK_SECRET_KEY'], instance_id='bench')
+
+def seed_session(client, user):
+    with client.session_transaction(base_url=BASE_URL) as session:
+        session['user_data'] = {
+            'item_id': f'item-{user}',
+            'user_id': f'user-{user}',
+            'uses': 3,
+            'job_titles': 'Senior Software Engineer',
+            'coachInteractions': 4,
+            'coachCounter': 1,
+        }
+        session['avatar'] = 'avatar_4'
+        session['voice'] = 'en-GB-OliverNeural'
+        session['total_questions'] = 0
+        session['user_metrics'] = {'playStopPressesCoach': 0, 'recordingsCoach': 0}
+
+def run_user(app, user, iterations, timings, errors):
+    client = app.test_client()
+    seed_session(client, user)
+    for _ in range(iterations):
+        for label, method, path, kwargs in REQUEST_MIX:
+            start = time.perf_counter()
+            response = client.open(path, method=method, base_url=BASE_URL, **kwargs)
+            timings[label].append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors[label] += 1
+
+def check_near_cache_hit(app, store):
+    """
+    Sends a read-only request twice, the second within the near-cache's fresh window.
+
+    :return: The store commands the second request issued, by name; empty if the hit was free.
+    """
+    client = app.test_client()
+    seed_session(client, 'near-cache-check')
+    client.get('/candidate/get_avatar', base_url=BASE_URL)
+    store.reset_stats()
+    client.get('/candidate/get_avatar', base_url=BASE_URL)
+    return store.stats()['commands']
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default=os.environ.get('SESSION_BACKEND', 'memory'),
+                        choices=['memory', 'fakeredis', 'local', 'redis'], help="session store to run against")
+    parser.add_argument('--users', type=int, default=16, help="concurrent virtual users")
+    parser.add_argument('--iterations', type=int, default=50, help="request mix repetitions per user")
+    parser.add_argument('--check-near-cache', action='store_true',
+                        help="enable the session near-cache and check that its hits issue no store command")
+    args = parser.parse_args()
+
+    if args.check_near_cache:
+        os.environ['SESSION_NEAR_CACHE'] = 'true'
+    app = build_app(args.backend)
+    store = app.config['SESSION_REDIS']
+    if args.check_near_cache:
+        if not hasattr(store, 'stats'):
+            raise SystemExit("--check-near-cache needs the in-process store (--backend memory)")
+        commands = check_near_cache_hit(app, store)
+        if commands:
+            raise SystemExit(f"Near-cache hit issued store commands: {commands}")
+        print("near-cache hit: no store commands")
+    if hasattr(store, 'reset_stats'):
+        store.reset_stats()
+
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    threads = [threading.Thread(target=run_user, args=(app, user, args.iterations, timings, errors))
+               for user in range(args.users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(values) for values in timings.values())
+    print(f"backend: {args.backend}, users: {args.users}, iterations: {args.iterations}")
+    print(f"{'endpoint':<20}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, _, _, _ in REQUEST_MIX:
+        values = timings[label]
+        print(f"{label:<20}{len(values):>10}{errors[label]:>8}"
+              f"{percentile(values, 0.50) * 1e3:>10.2f}{percentile(values, 0.95) * 1e3:>10.2f}"
+              f"{percentile(values, 0.99) * 1e3:>10.2f}")
+    print(f"\n{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    if hasattr(store, 'stats'):
+        stats = store.stats()
+        print(f"store round-trips: {stats['round_trips']} ({stats['round_trips'] / total:.2f} per request)")
+        print(f"store commands: {stats['commands']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Micro-benchmark for the session serializers.
+
+Compares encode/decode time and stored bytes for every codec/compression combination
+on a realistic session: the Barclays prompt, user data, avatar settings and a 30-turn
+conversation log.
+
+Usage:
+    python benchmarks/session_serializer_benchmark.py [--turns 30] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from website.session_serializer import SessionSerializer, msgpack, msgspec, zstandard  # noqa: E402
+
+PROMPT_PATH = os.path.join(ROOT, 'website', 'static', 'assets', 'prompt.txt')
+
+USER_TURN = ("In my last role I led the migration of our payments reconciliation service to an "
+             "event-driven design. We had roughly forty million transactions a day and the batch "
+             "jobs were overrunning, so I proposed splitting ingestion from matching, ")
+ASSISTANT_TURN = ("Thank you, that is a clear example of ownership. <b>Follow-up:</b> How did you measure "
+                  "the impact of the change, and what would you do differently if you had to deliver "
+                  "it again under a tighter regulatory deadline? <!--SECTION 2!--> ")
+
+def load_prompt():
+    try:
+        with open(PROMPT_PATH, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return "You are the interviewer for Barclays. " * 120
+
+def build_conversation(prompt, turns):
+    conversation = [{"role": "system", "content": prompt}]
+    for turn in range(turns):
+        conversation.append({"role": "user", "content": f"{USER_TURN * 2} (turn {turn})"})
+        conversation.append({"role": "assistant", "content": f"{ASSISTANT_TURN * 2} (turn {turn})"})
+    return conversation
+
+def build_session(prompt):
+    return {
+        '_id': '6f1c2a9e-3d4b-4c8e-9a71-2b5f0e8d1c34',
+        '_permanent': True,
+        '_user_id': 'b3c1d2e4-5f60-4a7b-8c9d-0e1f2a3b4c5d',
+        '_fresh': True,
+        'user_data': {
+            'item_id': 'b3c1d2e4-5f60-4a7b-8c9d-0e1f2a3b4c5d',
+            'user_id': '9a8b7c6d-5e4f-3a2b-1c0d-ef0123456789',
+            'cv_path': 'wix:document://v1/ugd/9a8b7c_0123456789abcdef.pdf/cv.pdf#fileName=cv.pdf',
+            'uses': 7,
+            'job_titles': 'Senior Software Engineer',
+        },
+        'avatar': 'avatar_4',
+        'voice': 'en-GB-OliverNeural',
+        'prompt': prompt,
+        'total_questions': 0,
+        'user_metrics': {'playStopPressesCoach': 12, 'recordingsCoach': 184.5},
+    }
+
+def serializers():
+    configs = [('json', None)]
+    configs += [('json', 'zlib')]
+    if msgpack is not None:
+        configs += [('msgpack', None), ('msgpack', 'zlib')]
+    if msgspec is not None:
+        configs += [('msgspec', None), ('msgspec', 'zlib')]
+    if zstandard is not None:
+        configs += [(codec, 'zstd') for codec, compression in list(configs) if compression is None]
+    for codec, compression in configs:
+        yield f"{codec}+{compression or 'raw'}", SessionSerializer(codec=codec, compression=compression)
+
+def measure(serializer, values, repeat):
+    encoded = [serializer.dumps(value) for value in values]
+    encode_time = min(timeit.repeat(lambda: [serializer.dumps(value) for value in values], number=repeat, repeat=3))
+    decode_time = min(timeit.repeat(lambda: [serializer.loads(data) for data in encoded], number=repeat, repeat=3))
+    return sum(len(data) for data in encoded), encode_time / repeat * 1e6, decode_time / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=30, help="conversation turns (user + assistant pairs)")
+    parser.add_argument('--repeat', type=int, default=200, help="iterations per timing run")
+    args = parser.parse_args()
+
+    prompt = load_prompt()
+    session = build_session(prompt)
+    conversation = build_conversation(prompt, args.turns)
+
+    workloads = [
+        # The whole session as one blob, as the original interface stored it
+        ('blob', [dict(session, conversation_log=conversation)]),
+        # One value per hash field, as InstanceAwareRedisSessionInterface stores it
+        ('fields', list(session.values())),
+        # One value per conversation list entry
+        ('conversation', conversation),
+    ]
+
+    print(f"prompt: {len(prompt)} chars, turns: {args.turns}, repeat: {args.repeat}")
+    print(f"{'workload':<14}{'serializer':<16}{'bytes':>10}{'encode us':>12}{'decode us':>12}")
+    for workload, values in workloads:
+        for name, serializer in serializers():
+            size, encode_us, decode_us = measure(serializer, values, args.repeat)
+            print(f"{workload:<14}{name:<16}{size:>10}{encode_us:>12.1f}{decode_us:>12.1f}")
+        print()
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,6 @@ import sys
 import logging
 from website import create_app
 from pathlib import Path
-from secrets import token_hex
 
 def configure_werkzeug_logger(show_log=False):
     log = logging.getLogger('werkzeug')
@@ -18,10 +17,13 @@ def configure_werkzeug_logger(show_log=False):
         log.handlers = []
         log.addHandler(logging.NullHandler())
 
-# Set environment variables
-os.environ['INSTANCE_ID'] = '0'  # Single instance
+# Set environment variables. On Azure every scaled-out instance gets its own WEBSITE_INSTANCE_ID;
+# with MULTI_INSTANCE=true sessions are shared between them, so the ID only names the log file.
+os.environ.setdefault('INSTANCE_ID', os.environ.get('WEBSITE_INSTANCE_ID', '0')[:8])
 
-os.environ['FLASK_SECRET_KEY'] = token_hex(24)
+# The signing key must be the same on every instance; when it is not set here create_app
+# reads 'FLASK-SECRET-KEY' from Key Vault.
+secret_key = os.environ.get('FLASK_SECRET_KEY')
 
 # Check if 'show_log' argument is provided
 show_log = 'show_log' in sys.argv
@@ -37,7 +39,7 @@ current_dir = Path(__file__).resolve().parent
 SSL_CERT = current_dir / 'cert.pem'
 SSL_KEY = current_dir / 'key.pem'
 
-app = create_app(secret_key=os.environ['FLASK_SECRET_KEY'], instance_id=os.environ['INSTANCE_ID'])
+app = create_app(secret_key=secret_key, instance_id=os.environ['INSTANCE_ID'])
 
 if __name__ == '__main__':
     if is_azure:
@@ -51,6 +53,7 @@ if __name__ == '__main__':
     app.logger.info(f"Debug mode: {'On' if debug else 'Off'}")
     app.logger.info(f"Redis URL: {app.config['SESSION_REDIS']}")
     app.logger.info(f"Running on Azure: {is_azure}")
+    app.logger.info(f"Instance: {app.config['INSTANCE_ID']} (multi-instance: {app.config['MULTI_INSTANCE']})")
     app.logger.info(f"Werkzeug logging: {'Enabled' if show_log else 'Disabled'}")
 
     if not is_azure:
@@ -1,129 +1,27 @@
-from flask import Flask, render_template, session, request, current_app, url_for, redirect, send_from_directory
-from flask.sessions import SessionInterface, SessionMixin
+from .startup import StartupTimer, STARTUP_SECRETS, REDIS_SECRETS, WARM_SECRETS, prefetch_secrets, prefetch_secrets_in_background
+from flask import Flask, render_template, session, request, current_app, url_for, redirect, send_from_directory, jsonify
 from flask_login import LoginManager
 from flask_cors import CORS
 import os
 import logging
 from logging.handlers import RotatingFileHandler
-import uuid
-import redis
 from datetime import timedelta, datetime
-from itsdangerous import Signer, want_bytes
-import json
+from secrets import token_hex
 from user_agents import parse
 from werkzeug.middleware.proxy_fix import ProxyFix
 from .wix_db import WixDatabase
 from .models import User
 from .secrets import get_secret
 from dotenv import load_dotenv
-from redis.retry import Retry
-from redis.backoff import ExponentialBackoff
 from .avatar import animation_bp
+from .redis_session import InstanceAwareRedisSessionInterface, SessionNearCache
+from .session_serializer import create_session_serializer
+from .metrics import MetricsAggregator
+from .cv_cache import CVCache
+from .redis_client import configure_redis_pool, configure_session_backend, create_session_store
 
 load_dotenv()
 
-class RedisSession(dict, SessionMixin):
-    def __init__(self, initial=None, sid=None, permanent=False):
-        self.sid = sid
-        self.permanent = permanent
-        if initial:
-            super().__init__(initial)
-        else:
-            super().__init__()
-
-class InstanceAwareRedisSessionInterface(SessionInterface):
-    serializer = json
-    session_class = RedisSession
-
-    def __init__(self, redis, key_prefix, secret_key, use_signer=False, permanent=False):
-        self.redis = redis
-        self.key_prefix = key_prefix
-        self.use_signer = use_signer
-        self.permanent = permanent
-        self.has_same_site_capability = hasattr(self, "get_cookie_samesite")
-        if self.use_signer:
-            self.signer = Signer(secret_key, salt='flask-session',
-                                 key_derivation='hmac')
-
-    def open_session(self, app, request):
-        """
-        This method opens a session for the user by retrieving the session data from Redis.
-        If no session ID (SID) is found in the cookies, it generates a new one.
-        If session data is available in Redis, it loads the session; otherwise, it creates a new session.
-
-        :param app: The Flask application instance.
-        :param request: The Flask request object.
-        :return: The user session.
-        """
-        sid = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
-        if not sid:
-            sid = self.generate_sid()
-            # current_app.logger.debug(f"Generated new session ID: {sid}")
-        # else:
-            # current_app.logger.debug(f"Existing session ID: {sid}")
-
-        max_retry_attempts = 3
-        retry_attempts = 0
-
-        while retry_attempts < max_retry_attempts:
-            try:
-                val = self.redis.get(self.key_prefix + sid)
-                if val is not None:
-                    data = self.serializer.loads(val)
-                    session = self.session_class(initial=data, sid=sid)
-                    # Ensure '_id' matches 'sid'
-                    session['_id'] = sid
-                    # current_app.logger.debug(f"Loaded session data: {dict(session)}")
-                    return session
-                break  # Exit loop if there is no value
-            except Exception as e:
-                retry_attempts += 1
-                current_app.logger.warning(f"Attempt {retry_attempts}: Failed to load session data for SID: {sid}, Error: {e}")
-                if retry_attempts >= max_retry_attempts:
-                    raise e
-
-        # Create new session
-        session = self.session_class(sid=sid, permanent=self.permanent)
-        session['_id'] = sid
-        # current_app.logger.debug(f"Created new session: {dict(session)}")
-        return session
-
-    def save_session(self, app, session, response):
-        domain = self.get_cookie_domain(app)
-        path = self.get_cookie_path(app)
-        if not session:
-            if session.modified:
-                self.redis.delete(self.key_prefix + session.sid)
-                response.delete_cookie(app.config['SESSION_COOKIE_NAME'],
-                                       domain=domain, path=path)
-            return
-
-        httponly = self.get_cookie_httponly(app)
-        secure = self.get_cookie_secure(app)
-        expires = self.get_expiration_time(app, session)
-
-        session['_id'] = session.sid
-        val = self.serializer.dumps(dict(session))
-
-        max_age = int(app.permanent_session_lifetime.total_seconds())
-        self.redis.setex(name=self.key_prefix + session.sid, value=val,
-                         time=max_age)
-
-        if self.use_signer:
-            session_id = self.signer.sign(want_bytes(session.sid))
-        else:
-            session_id = session.sid
-        #current_app.logger.debug(f"Saving session with ID: {session.sid}")
-
-        response.set_cookie(app.config['SESSION_COOKIE_NAME'], session_id,
-                            expires=expires, httponly=httponly,
-                            domain=domain, path=path, secure=secure)
-
-    def generate_sid(self):
-        new_sid = str(uuid.uuid4())
-        #current_app.logger.debug(f"Generated new session ID: {new_sid}")
-        return new_sid
-
 def is_mobile():
     user_agent_string = request.headers.get('User-Agent')
     user_agent = parse(user_agent_string)
@@ -133,13 +31,27 @@ def is_mobile():
 ## This function is called when the app is created.
 
 def create_app(secret_key=None, instance_id=None):
+    timer = StartupTimer()
     app = Flask(__name__, static_folder='static')
+    app.extensions['startup'] = timer
+
+    # Session store configuration, read first since it decides which secrets are needed
+    configure_redis_pool(app)
+    configure_session_backend(app)
+    backend = app.config['SESSION_BACKEND']
+
+    # Every secret startup needs is fetched concurrently up front; the get_secret calls
+    # below are then served from the secret cache
+    with timer.phase('secrets'):
+        startup_secrets = [name for name in STARTUP_SECRETS if not (secret_key and name == 'FLASK-SECRET-KEY')]
+        prefetch_secrets(startup_secrets + list(REDIS_SECRETS if backend == 'redis' else ()))
 
     app.config['WIX_API_KEY'] = get_secret('WIX-API-KEY')
     app.config['WIX_SITE_ID'] = get_secret('WIX-SITE-ID')
 
-    wix_db = WixDatabase(api_key=app.config['WIX_API_KEY'], site_id=app.config['WIX_SITE_ID'])
-    wix_db.init_app(app)
+    with timer.phase('wix'):
+        wix_db = WixDatabase(api_key=app.config['WIX_API_KEY'], site_id=app.config['WIX_SITE_ID'])
+        wix_db.init_app(app)
 
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_port=1, x_prefix=1)
 
@@ -165,7 +77,18 @@ def create_app(secret_key=None, instance_id=None):
         "max_age": 600
     }})
 
-    app.config['SECRET_KEY'] = secret_key or 'AseOlgTpPTsz46P'
+    # In multi-instance mode all instances share one session namespace and signing key,
+    # so any instance behind the load balancer can serve any request
+    app.config['MULTI_INSTANCE'] = os.environ.get('MULTI_INSTANCE', 'false').lower() == 'true'
+
+    secret_key = secret_key or get_secret('FLASK-SECRET-KEY')
+    if not secret_key:
+        if app.config['MULTI_INSTANCE']:
+            raise RuntimeError("MULTI_INSTANCE requires a shared FLASK_SECRET_KEY (env or Key Vault 'FLASK-SECRET-KEY').")
+        app.logger.warning("No FLASK_SECRET_KEY configured, using a random per-process key.")
+        secret_key = token_hex(24)
+
+    app.config['SECRET_KEY'] = secret_key
     app.config['INSTANCE_ID'] = instance_id
     app.config['SESSION_COOKIE_NAME'] = 'session'
     app.config['SESSION_COOKIE_SAMESITE'] = 'None'
@@ -173,41 +96,43 @@ def create_app(secret_key=None, instance_id=None):
     app.config['SESSION_COOKIE_HTTPONLY'] = True
     app.config['PREFERRED_URL_SCHEME'] = 'https'
 
-    # Redis configuration
     host = "mindorah-interviewer-redis.redis.cache.windows.net"
     port = 6380
-    password = get_secret('KEY1-REDIS')
+    # Only the Azure cache needs the Key Vault password
+    password = get_secret('KEY1-REDIS') if backend == 'redis' else None
 
     try:
-        # Create a retry strategy with exponential backoff
-        retry_strategy = Retry(
-            retries=3,
-            backoff=ExponentialBackoff(cap=1, base=0.1)  # Start with 0.1s, increase exponentially, cap at 1s
-        )
-
-        # Create Redis client with retry strategy
-        redis_client = redis.Redis(
-            host=host,
-            port=port,
-            password=password,
-            ssl=True,
-            decode_responses=True,
-            socket_keepalive=True,
-            socket_timeout=300,
-            retry=retry_strategy,
-            retry_on_timeout=True
-        )
-
-        redis_client.ping()  # Test the connection
-        app.logger.info("Successfully connected to Azure Redis Cache")
+        with timer.phase('session store'):
+            # Pooled client with bounded waits; see redis_client.configure_redis_pool for the knobs
+            redis_client, async_redis_clients = create_session_store(app, host, port, password)
+
+            redis_client.ping()  # Test the connection
+        app.logger.info(f"Successfully connected to the '{backend}' session store")
     except Exception as e:
-        app.logger.error(f"Error connecting to Redis: {e}")
+        app.logger.error(f"Error connecting to the '{backend}' session store: {e}")
         raise
 
+    if app.config['MULTI_INSTANCE'] and backend in ('memory', 'fakeredis'):
+        app.logger.warning(f"SESSION_BACKEND={backend} is per process; sessions are not shared between instances.")
+
     app.config['SESSION_TYPE'] = 'redis'
     app.config['SESSION_REDIS'] = redis_client
-    app.config['SESSION_KEY_PREFIX'] = f'session:{instance_id}:'
+    app.config['SESSION_KEY_PREFIX'] = 'session:' if app.config['MULTI_INSTANCE'] else f'session:{instance_id}:'
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
+    # Paths served without loading or saving a session (static files and preflights are always exempt)
+    app.config.setdefault('SESSION_EXEMPT_PATHS', ('/favicon.ico', '/health', '/robots.txt'))
+    # Optional per-worker near-cache for session reads
+    app.config.setdefault('SESSION_NEAR_CACHE', os.environ.get('SESSION_NEAR_CACHE', 'false').lower() == 'true')
+    app.config.setdefault('SESSION_NEAR_CACHE_TTL', float(os.environ.get('SESSION_NEAR_CACHE_TTL', 0.5)))
+    app.config.setdefault('SESSION_NEAR_CACHE_SIZE', int(os.environ.get('SESSION_NEAR_CACHE_SIZE', 1024)))
+
+    near_cache = None
+    if app.config['SESSION_NEAR_CACHE']:
+        near_cache = SessionNearCache(max_entries=app.config['SESSION_NEAR_CACHE_SIZE'],
+                                      fresh_for=app.config['SESSION_NEAR_CACHE_TTL'])
+    app.config.setdefault('SESSION_SERIALIZER', os.environ.get('SESSION_SERIALIZER', 'msgpack'))
+    app.config.setdefault('SESSION_COMPRESSION', os.environ.get('SESSION_COMPRESSION', 'zlib'))
+    app.config.setdefault('SESSION_COMPRESSION_THRESHOLD', int(os.environ.get('SESSION_COMPRESSION_THRESHOLD', 1024)))
 
     # Use custom SessionInterface
     app.session_interface = InstanceAwareRedisSessionInterface(
@@ -215,15 +140,32 @@ def create_app(secret_key=None, instance_id=None):
         key_prefix=app.config['SESSION_KEY_PREFIX'],
         secret_key=app.config['SECRET_KEY'],
         use_signer=app.config.get('SESSION_USE_SIGNER', False),
-        permanent=app.config.get('SESSION_PERMANENT', False)
+        permanent=app.config.get('SESSION_PERMANENT', False),
+        serializer=create_session_serializer(app),
+        near_cache=near_cache,
+        async_redis=async_redis_clients,
+        hash_tag=app.config['REDIS_CLUSTER']
     )
 
+    # Usage counters are accumulated in Redis and flushed to the Wix 'metrics' collection
+    app.config.setdefault('METRICS_FLUSH_INTERVAL', float(os.environ.get('METRICS_FLUSH_INTERVAL', 60)))
+    app.extensions['metrics'] = MetricsAggregator(redis_client, wix_db, app,
+                                                  flush_interval=app.config['METRICS_FLUSH_INTERVAL'],
+                                                  hash_tag=app.config['REDIS_CLUSTER'])
+
+    # Extracted and parsed CVs, shared by all workers through the session store
+    app.config.setdefault('CV_CACHE_TTL', int(os.environ.get('CV_CACHE_TTL', 86400)))
+    app.config.setdefault('CV_CACHE_SIZE', int(os.environ.get('CV_CACHE_SIZE', 256)))
+    app.extensions['cv_cache'] = CVCache(redis_client, max_entries=app.config['CV_CACHE_SIZE'],
+                                         ttl=app.config['CV_CACHE_TTL'])
+
     configure_logging(app)
     # Import webApp routes...
-    from .candidate_view import candidate_view
-    from .candidate_auth import candidate_auth
-    from .server import server
-    from .secrets import secrets
+    with timer.phase('blueprints'):
+        from .candidate_view import candidate_view
+        from .candidate_auth import candidate_auth
+        from .server import server
+        from .secrets import secrets
     # Register blueprints...
     app.register_blueprint(candidate_view, url_prefix="/candidate")
     app.register_blueprint(candidate_auth, url_prefix="/candidate")
@@ -257,18 +199,27 @@ def create_app(secret_key=None, instance_id=None):
             app.logger.error(f"Error serving favicon: {str(e)}")
             return '', 404  # Return a 404 if the favicon can't be served
 
+    @app.route('/health')
+    def health():
+        return jsonify({"status": "ok"})
+
     @app.route('/mobile')
     def mobile_message():
         return render_template('mobile.html')
 
     @app.before_request
     def before_request():
+        # Session-exempt requests (static files, probes, preflights) have nothing to check
+        if app.session_interface.is_null_session(session):
+            return
+
         try:
             # Check if we are on a mobile device.
             #if is_mobile() and request.endpoint not in ['mobile_message', 'static']:
             #    return redirect(url_for('mobile_message'))
 
-            # Set session param, check if there's any problems with the session
+            # Set session param, check if there's any problems with the session.
+            # Unchanged values are not written back, so this does not force a save.
             session.permanent = True
             app.permanent_session_lifetime = timedelta(hours=1)
 
@@ -290,6 +241,10 @@ def create_app(secret_key=None, instance_id=None):
 
         return response
 
+    # The AI, search and speech clients are built on first use; warm their secrets meanwhile
+    prefetch_secrets_in_background(WARM_SECRETS)
+    app.logger.info(timer.format_report())
+
     return app
 
 def configure_logging(app):
@@ -1,42 +1,64 @@
 from flask import session, current_app
-from openai import AzureOpenAI # openai v1.x+ is synchronous by default
 from .secrets import get_secret # Your existing secrets function
+from .conversation_log import get_conversation_log
 import http.client # For HTTPException
-import tiktoken
-
-# For Azure AI Search (Synchronous version)
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient # Synchronous version
-from azure.search.documents.models import VectorizedQuery # Model class is often shared
+import threading
 
 class AzureAIAgent:
+    """
+    The OpenAI client, tokenizer and search client are built on first use rather than when
+    the agent is created, and their SDKs are imported then too, so importing candidate_view
+    does not block on Key Vault, on loading the tiktoken encoding or on the SDK imports.
+    """
     def __init__(self, deployment_name="o4-mini"):
-        # --- OpenAI Client Initialization ---
-        self.chat_api_key = get_secret('KEY1-AI-US')
-        self.chat_azure_endpoint = get_secret('AI-ENDPOINT-US')
         self.api_version = "2025-04-01-preview" # Ensure this is a valid, current string version
-
-        self.client = AzureOpenAI(
-            api_key=self.chat_api_key,
-            api_version=self.api_version,
-            azure_endpoint=self.chat_azure_endpoint
-        )
-
-
         self.deployment_name = deployment_name
-        self.encoding = tiktoken.get_encoding("cl100k_base")
         self.embedding_deployment_name = "text-embedding-3-large"
-
-        # --- Azure AI Search Client Initialization (Synchronous) ---
         self.search_endpoint = "https://stewardsearch.search.windows.net"
-        self.search_query_key = get_secret('STEWARD-SEARCH-API-KEY')
         self.search_index_name ="txt-rag-index-barclay"
 
-        self.search_client = SearchClient(
-            endpoint=self.search_endpoint,
-            index_name=self.search_index_name,
-            credential=AzureKeyCredential(self.search_query_key)
-        )
+        self._client = None
+        self._encoding = None
+        self._search_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # --- OpenAI Client Initialization ---
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import AzureOpenAI # openai v1.x+ is synchronous by default
+                    self._client = AzureOpenAI(
+                        api_key=get_secret('KEY1-AI-US'),
+                        api_version=self.api_version,
+                        azure_endpoint=get_secret('AI-ENDPOINT-US')
+                    )
+        return self._client
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            with self._lock:
+                if self._encoding is None:
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+        return self._encoding
+
+    @property
+    def search_client(self):
+        # --- Azure AI Search Client Initialization (Synchronous) ---
+        if self._search_client is None:
+            with self._lock:
+                if self._search_client is None:
+                    from azure.core.credentials import AzureKeyCredential
+                    from azure.search.documents import SearchClient # Synchronous version
+                    self._search_client = SearchClient(
+                        endpoint=self.search_endpoint,
+                        index_name=self.search_index_name,
+                        credential=AzureKeyCredential(get_secret('STEWARD-SEARCH-API-KEY'))
+                    )
+        return self._search_client
 
     def count_tokens(self, messages):
         num_tokens = 0
@@ -75,6 +97,7 @@ class AzureAIAgent:
             return []
 
         try:
+            from azure.search.documents.models import VectorizedQuery # Model class is often shared
             vector_query = VectorizedQuery(vector=query_embedding, k_nearest_neighbors=top_k, fields="embedding")
 
             # Synchronous call
@@ -103,31 +126,33 @@ class AzureAIAgent:
             if prompt_text:
                 prompt_text = prompt_text.strip()
                 if prompt_text:
-                    session['conversation_log'] = [{"role": "system", "content": prompt_text}]
-                    session.modified = True
+                    get_conversation_log().reset([{"role": "system", "content": prompt_text}])
                 else:
                     raise ValueError("Empty prompt after stripping. Using default prompt.")
             else:
                 raise ValueError("Prompt not found in session. Using default prompt.")
         except Exception as e:
             current_app.logger.error(f"Error loading system prompt (sync): {e}")
-            session['conversation_log'] = [{"role": "system", "content": "You are a friendly AI interviewer."}]
-            session.modified = True
+            get_conversation_log().reset([{"role": "system", "content": "You are a friendly AI interviewer."}])
 
     def send_to_azure_agent(self):
         if not self.client:
             current_app.logger.error("AzureOpenAI client not initialized. Cannot send message.")
             return "I'm sorry, there's a configuration issue with the AI service."
 
-        if 'conversation_log' not in session or not session['conversation_log']:
+        # One LRANGE for the whole log; the list is only re-read if the system prompt had to be seeded
+        conversation_log = get_conversation_log()
+        conversation_messages = conversation_log.to_list()
+        if not conversation_messages:
             self.load_system_prompt_from_file()
+            conversation_messages = conversation_log.to_list()
 
         # --- Start of RAG Logic ---
         rag_input_text = ""
         retrieved_chunks_for_logging = [] # This will now hold chunks to be used for context
 
-        if session.get('conversation_log') and isinstance(session['conversation_log'], list) and len(session['conversation_log']) > 0:
-            log_to_modify_for_rag = [dict(msg) for msg in session['conversation_log']]
+        if conversation_messages:
+            log_to_modify_for_rag = [dict(msg) for msg in conversation_messages]
             current_app.logger.info(f"RAG Prep: Original log length for RAG processing: {len(log_to_modify_for_rag)}")
 
             idx_to_remove_system = -1
@@ -176,7 +201,7 @@ class AzureAIAgent:
             else:
                 current_app.logger.info("RAG Prep: Modified conversation log for RAG is empty. No RAG input text will be generated.")
         else:
-            current_app.logger.info("RAG Prep: Session conversation_log is empty, not found, or not a list initially. Skipping RAG preparation.")
+            current_app.logger.info("RAG Prep: Conversation log is empty initially. Skipping RAG preparation.")
 
         current_app.logger.debug(f"RAG Execution Check: rag_input_text='{rag_input_text[:50] if rag_input_text else ''}...' (Length: {len(rag_input_text) if rag_input_text else 0}, Type: {type(rag_input_text)})")
 
@@ -204,7 +229,7 @@ class AzureAIAgent:
         # --- End of RAG Logic ---
 
         # --- Prepare messages for LLM, potentially with RAG context ---
-        messages_for_llm = [dict(msg) for msg in session['conversation_log']] # Start with a copy of the original log
+        messages_for_llm = [dict(msg) for msg in conversation_messages] # Start with a copy of the original log
 
         if retrieved_chunks_for_logging: # If RAG provided chunks
             context_header = "System note: The following information has been retrieved from relevant Sage product documents, and you can use as context where appropriate:"
@@ -246,11 +271,8 @@ class AzureAIAgent:
 
             ai_response = response.choices[0].message.content.strip()
 
-            # Append only the AI's direct response to the persistent conversation_log
-            if 'conversation_log' not in session or not isinstance(session['conversation_log'], list):
-                session['conversation_log'] = []
-            session['conversation_log'].append({"role": "assistant", "content": ai_response})
-            session.modified = True
+            # Append only the AI's direct response to the persistent conversation log
+            conversation_log.append({"role": "assistant", "content": ai_response})
 
             # Metrics (synchronous calculation)
             # input_tokens = self.count_tokens(messages_for_llm) # Count tokens from what was actually sent
@@ -1,5 +1,5 @@
 import json
-from openai import AzureOpenAI
+import threading
 from .secrets import get_secret
 
 DEPLOYMENT_NAME = "o4-mini"
@@ -54,12 +54,25 @@ cv_extraction_tool = {
     }
 }
 
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    # The OpenAI SDK is imported and the client built on the first CV, then reused
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import AzureOpenAI
+                _client = AzureOpenAI(
+                    api_key=get_secret('KEY1-AI-US'),
+                    api_version="2025-04-01-preview",
+                    azure_endpoint=get_secret('AI-ENDPOINT-US')
+                )
+    return _client
+
 def process_cv_with_ai(cv_text):
-    client = AzureOpenAI(
-        api_key=get_secret('KEY1-AI-US'),
-        api_version="2025-04-01-preview",
-        azure_endpoint=get_secret('AI-ENDPOINT-US')
-    )
+    client = get_client()
 
     messages = [
         {"role": "system", "content": """You are an expert assistant specializing in extracting structured information from curriculum vitae (CVs).
@@ -1,3 +1,4 @@
+import asyncio
 import threading
 
 # Global stop event
@@ -10,4 +11,16 @@ def reset_api_event():
     stop_event.clear()
 
 def is_stop_event_set():
-    return stop_event.is_set()
\ No newline at end of file
+    return stop_event.is_set()
+
+# One event loop per worker thread, reused across requests so that async connection
+# pools (Redis, HTTP) survive between requests instead of being rebuilt every time
+_thread_loops = threading.local()
+
+def run_async(func, *args):
+    loop = getattr(_thread_loops, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _thread_loops.loop = loop
+    asyncio.set_event_loop(loop)
+    return loop.run_until_complete(func(*args))
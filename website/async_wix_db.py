@@ -0,0 +1,237 @@
+import asyncio
+import atexit
+import time
+import weakref
+import aiohttp
+from flask import current_app
+from .http_client import HTTP_POOL_SIZE, HTTP_TIMEOUT
+from .wix_stats import endpoint_label
+
+# Same default projection as WixDatabase.get_user
+USER_FIELDS = ('userId', 'cv', 'uses', 'jobTitles')
+
+class AsyncWixDatabase:
+    """
+    asyncio counterpart of WixDatabase's read paths, built on aiohttp.
+
+    Shares credentials, collection names and caches with the synchronous WixDatabase it wraps,
+    so both can be used side by side. Independent lookups are meant to be awaited together
+    with gather(), which makes the latency of a group of calls that of the slowest one rather
+    than their sum. Must be used from a running event loop (see api_utils.run_async).
+    """
+    def __init__(self, wix_db):
+        self.wix_db = wix_db
+        self.sessions = weakref.WeakKeyDictionary()  # event loop -> aiohttp.ClientSession
+        atexit.register(self.close)
+
+    def get_session(self):
+        # aiohttp sessions belong to the loop that created them; there is one loop per worker thread
+        loop = asyncio.get_running_loop()
+        http_session = self.sessions.get(loop)
+        if http_session is None or http_session.closed:
+            http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(sock_connect=HTTP_TIMEOUT[0], sock_read=HTTP_TIMEOUT[1]),
+                cookie_jar=aiohttp.DummyCookieJar()
+            )
+            self.sessions[loop] = http_session
+        return http_session
+
+    def close(self):
+        """
+        Closes the aiohttp session of every event loop that is not running. Registered with atexit.
+        """
+        for loop, http_session in list(self.sessions.items()):
+            if http_session.closed or loop.is_closed() or loop.is_running():
+                continue
+            try:
+                loop.run_until_complete(http_session.close())
+            except Exception:
+                # Shutting down anyway; the connections are dropped with the process
+                pass
+
+    def headers(self):
+        return {
+            'Content-Type': 'application/json',
+            'Authorization': self.wix_db.api_key,
+            'wix-site-id': self.wix_db.site_id
+        }
+
+    async def gather(self, *calls):
+        """
+        Awaits several independent calls concurrently.
+
+        :return: Their results in order; a call that raised yields None (the error is logged),
+                 like the synchronous getters do on failure.
+        """
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                current_app.logger.error(f"Error in concurrent Wix call: {str(result)}")
+        return [None if isinstance(result, Exception) else result for result in results]
+
+    async def request(self, method, url, data=None, headers=None):
+        """
+        Sends a request to any Wix endpoint.
+
+        :return: The parsed JSON response, or None on any error.
+        """
+        try:
+            async with self.get_session().request(method, url, headers=headers or self.headers(), json=data) as response:
+                if response.status >= 400:
+                    current_app.logger.error(f"Wix request {method} {url} failed with status {response.status}: {await response.text()}")
+                    return None
+                return await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            current_app.logger.error(f"Error making request: {e}")
+            return None
+
+    async def _make_request(self, method, endpoint, data=None):
+        """
+        Sends a request to the Wix Data API, with the retries, circuit breaker and statistics
+        of WixDatabase._make_request, whose WixCallPolicy it shares.
+
+        :return: The parsed JSON response, or None on any error.
+        """
+        policy = self.wix_db.policy
+        label = endpoint_label(method, endpoint)
+        collection_id = (data or {}).get('dataCollectionId')
+        for delay in policy.delays(method, endpoint):
+            if delay:
+                await asyncio.sleep(delay)
+            if not policy.allow(label):
+                return None
+            started = time.perf_counter()
+            error, body = await self._send(method, endpoint, data, label)
+            if not policy.finish(label, collection_id, time.perf_counter() - started, error, body):
+                return self.wix_db._parse(label, error, body)
+        return None
+
+    async def _send(self, method, endpoint, data, label):
+        # One attempt of _make_request; returns (error, response text), see WixCallPolicy.finish
+        url = f"{self.wix_db.base_url}/{endpoint}"
+        try:
+            async with self.get_session().request(method, url, headers=self.headers(), json=data) as response:
+                return (response.status if response.status >= 400 else None), await response.text()
+        except asyncio.TimeoutError as e:
+            current_app.logger.error(f"Wix request {label} timed out: {e}")
+            return 'timeout', None
+        except aiohttp.ClientConnectorError as e:
+            current_app.logger.error(f"Wix request {label} could not connect: {e}")
+            return 'connect', None
+        except aiohttp.ClientError as e:
+            current_app.logger.error(f"Error making request {label}: {e}")
+            return 'connection', None
+
+    async def _query_first(self, collection_id, query_filter, fields=None):
+        query = {"filter": query_filter, "limit": 1}
+        if fields:
+            query["fields"] = list(fields)
+        result = await self._make_request("POST", "items/query", {"dataCollectionId": collection_id, "query": query})
+        if result and 'dataItems' in result and len(result['dataItems']) > 0:
+            return result['dataItems'][0].get('data', {})
+        return None
+
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+    async def get_user(self, item_id, fields=USER_FIELDS):
+        """
+        Fetches user data based on item_id from the CandidateData collection and returns a User instance.
+
+        :param fields: The fields to fetch, by default only those the User is built from.
+                       None fetches the whole item.
+        """
+        collection_id = self.wix_db.candidateData_collection_id
+        if self.wix_db.mirror is not None:
+            mirrored = self.wix_db.mirror.get(collection_id, item_id, fields=fields)
+            if mirrored is not None:
+                return self.wix_db._user_from_item(item_id, mirrored)
+
+        user_data = await self._query_first(collection_id, {"_id": item_id}, fields=fields)
+        if user_data is None:
+            current_app.logger.error(f"User not found with item_id: {item_id}")
+            return None
+
+        if not fields:
+            self.wix_db._remember_item(collection_id, item_id, user_data)
+        return self.wix_db._user_from_item(item_id, user_data)
+
+    async def get_prompt(self, interviewTitle):
+        """
+        Retrieves the prompt for interviewTitle from the Interviews collection.
+        """
+        if self.wix_db.mirror is not None:
+            mirrored = self.wix_db.mirror.find_first(self.wix_db.template_collection_id, 'interviewTitle', interviewTitle,
+                                                         fields=['prompt'])
+            if mirrored is not None:
+                return mirrored.get('prompt')
+
+        item = await self._query_first(self.wix_db.template_collection_id, {"interviewTitle": interviewTitle}, fields=["prompt"])
+        if item is None:
+            current_app.logger.warning(f"No prompt found for {interviewTitle}")
+            return None
+        return item.get('prompt')
+
+    async def get_cached_prompt(self, interviewTitle):
+        """
+        Returns the prompt from WixDatabase's prompt cache. On a miss this waits for the cache's
+        own load (in a thread, so the event loop keeps running), which concurrent logins share.
+        """
+        prompt_cache = self.wix_db.prompt_cache
+        if prompt_cache is None:
+            return await self.get_prompt(interviewTitle)
+        return await asyncio.to_thread(prompt_cache.get, interviewTitle)
+
+    async def get_cv_document_uri(self, user_id):
+        """
+        Fetches a user's CV document URI from the CandidateData collection.
+        """
+        if self.wix_db.mirror is not None:
+            mirrored = self.wix_db.mirror.find_first(self.wix_db.candidateData_collection_id, 'userId', user_id, fields=['cv'])
+            if mirrored is not None:
+                return mirrored.get('cv')
+
+        item = await self._query_first(self.wix_db.candidateData_collection_id, {"userId": user_id}, fields=["cv"])
+        if item is None:
+            current_app.logger.warning(f"CV not found for user ID: {user_id}")
+            return None
+        return item.get('cv')
+
+    async def get_file_url(self, document_uri):
+        """
+        Converts a Wix document URI to an accessible URL.
+
+        The three Wix endpoints that can resolve it are alternatives, so they are asked one at
+        a time in order of preference and the first answer is used.
+        """
+        parts = document_uri.replace('wix:document://', '').split('/')
+        if len(parts) < 2:
+            current_app.logger.error(f"Invalid document URI format: {document_uri}")
+            return None
+        document_id = parts[1]
+
+        site_media = await self.request("GET", f"https://www.wixapis.com/site-media/v1/files/{document_id}")
+        if site_media and 'url' in site_media.get('file', {}):
+            return site_media['file']['url']
+        documents = await self.request("POST", "https://www.wixapis.com/documents/v1/documents/download", {"documentId": document_id})
+        if documents and 'downloadUrl' in documents:
+            return documents['downloadUrl']
+        download_url = await self.request("GET", f"https://www.wixapis.com/site-media/v1/files/{document_id}/download-url")
+        if download_url and 'downloadUrl' in download_url:
+            return download_url['downloadUrl']
+
+        current_app.logger.error("All API attempts failed to get a download URL")
+        return None
+
+    async def download(self, url):
+        """
+        :return: The body of url as bytes, or None on any error.
+        """
+        try:
+            async with self.get_session().get(url) as response:
+                response.raise_for_status()
+                return await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            current_app.logger.error(f"Error downloading {url}: {e}")
+            return None
@@ -1,12 +1,18 @@
 from flask import jsonify, Blueprint, request, current_app, session
-import azure.cognitiveservices.speech as speechsdk
 from typing import List, Dict
 import base64
 from .secrets import get_secret
+from .metrics import record_metric
 import time
 
 animation_bp = Blueprint('animation', __name__)
 
+def get_speechsdk():
+    # The Speech SDK loads a large native library; import it on the first synthesis rather
+    # than in every worker at startup (later calls are a sys.modules lookup)
+    import azure.cognitiveservices.speech as speechsdk
+    return speechsdk
+
 class SpeechSynthesizer:
     def __init__(self):
         self.speech_key = get_secret('KEY1-SPEECH')
@@ -28,6 +34,7 @@ class SpeechSynthesizer:
                 self.synthesizer = None
             self.viseme_data = []
 
+            speechsdk = get_speechsdk()
             speech_config = speechsdk.SpeechConfig(subscription=self.speech_key, region=self.speech_region)
             speech_config.speech_synthesis_voice_name = session.get('voice')
             speech_config.speech_synthesis_voice_rate = session.get('speechSynthesisVoiceRate')
@@ -66,7 +73,7 @@ class SpeechSynthesizer:
         current_app.logger.debug("Viseme data reset for new synthesis")
         result = self.synthesizer.speak_text_async(text).get()
 
-        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+        if result.reason == get_speechsdk().ResultReason.SynthesizingAudioCompleted:
             current_app.logger.debug('Speech synthesis completed successfully.')
             return self.process_synthesis_result(result)
         else:
@@ -190,12 +197,7 @@ def synthesize_speech():
         audio_base64 = base64.b64encode(result['audio']).decode('utf-8')
 
         # Increment playStop counter
-        if 'user_metrics' not in session:
-            session['user_metrics'] = {}
-        if 'playStopPressesCoach' not in session['user_metrics']:
-            session['user_metrics']['playStopPressesCoach'] = 0
-        session['user_metrics']['playStopPressesCoach'] += 1
-        session.modified = True
+        record_metric('playStopPressesCoach')
 
         response_data = {
             'animation': result['animation'],
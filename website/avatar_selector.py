@@ -0,0 +1,74 @@
+from collections import namedtuple
+from types import MappingProxyType
+from .refreshing_cache import RefreshingCache
+
+AvatarConfig = namedtuple('AvatarConfig', ['avatar', 'voice', 'speech_rate'])
+
+# Used for any (interviewType, run) the selector has no entry for
+DEFAULT_AVATAR_CONFIG = AvatarConfig(avatar="avatar_1", voice="en-US-AvaMultilingualNeural", speech_rate=0)
+
+INDEX_KEY = 'avatar_selector'
+
+def build_avatar_index(avatar_data):
+    """
+    Turns the avatar_selector JSON list into a read-only mapping of (interviewType, run) to AvatarConfig.
+    Entries missing a field get the default for that field; the first entry for a pair wins.
+
+    :param avatar_data: The parsed 'avatarSelector' list from Wix.
+    :return: A MappingProxyType, safe to share between threads.
+    """
+    index = {}
+    for entry in avatar_data or []:
+        try:
+            key = (entry['interviewType'], entry['run'])
+        except (KeyError, TypeError):
+            continue
+        index.setdefault(key, AvatarConfig(
+            avatar=entry.get('avatar', DEFAULT_AVATAR_CONFIG.avatar),
+            voice=entry.get('voice', DEFAULT_AVATAR_CONFIG.voice),
+            speech_rate=entry.get('speechSynthesisVoiceRate', DEFAULT_AVATAR_CONFIG.speech_rate)
+        ))
+    return MappingProxyType(index)
+
+class AvatarSelectorIndex:
+    """
+    The avatar selector from Wix, loaded once per process into an immutable lookup table.
+
+    The first lookup starts loading the table in the background; after that it is replaced as
+    a whole by a background refresh on the first lookup more than `ttl` seconds after the last
+    load, so lookups never make a remote call, never scan the list and never see a half-built
+    table. Until the first load has finished, lookups return DEFAULT_AVATAR_CONFIG. Call
+    preload() to have the table ready before the first lookup.
+    """
+    def __init__(self, wix_db, app, ttl=3600):
+        self.wix_db = wix_db
+        # Served stale indefinitely: an old selector is better than the defaults
+        self.cache = RefreshingCache(self._load, ttl=ttl, stale_ttl=float('inf'), app=app, name='avatar-selector')
+
+    def preload(self):
+        """
+        Starts loading the selector in the background, so it is ready before the first login.
+        """
+        self.cache.refresh(INDEX_KEY)
+
+    def lookup(self, interviewType, run):
+        """
+        :return: The AvatarConfig for the pair, or DEFAULT_AVATAR_CONFIG.
+        """
+        index = self.cache.get(INDEX_KEY, wait=False)
+        if index is None:
+            return DEFAULT_AVATAR_CONFIG
+        return index.get((interviewType, run), DEFAULT_AVATAR_CONFIG)
+
+    def reload(self):
+        """
+        Reloads the selector in the background after it was edited in Wix; lookups keep using
+        the current table until the new one is ready.
+        """
+        self.cache.refresh(INDEX_KEY)
+
+    def _load(self, key):
+        avatar_data = self.wix_db.get_avatar_selector()
+        if avatar_data is None:
+            return None
+        return build_avatar_index(avatar_data)
@@ -2,21 +2,31 @@ from flask import Blueprint, jsonify, current_app, redirect, url_for, session, r
 from flask_login import login_user
 from flask_cors import cross_origin
 from .models import User
-from .cv_utils import get_cv_text
+from .cv_utils import async_get_cv_text
 from .ai_parsing import process_cv_with_ai
+from .conversation_log import get_conversation_log
+from .api_utils import run_async
+from .avatar_selector import DEFAULT_AVATAR_CONFIG
 import json
 
 def parse_pdf(id):
-    # Get the CV text
-    extracted_data = get_cv_text(id)
+    # Get the CV text; the Wix lookups run concurrently on the worker thread's event loop.
+    # An unchanged CV comes from the CV cache, with its parsed result if there is one.
+    cv_cache = current_app.extensions.get('cv_cache')
+    extracted_data = run_async(async_get_cv_text, id, current_app.extensions['async_wix_db'], cv_cache)
 
     # Check if extraction was successful
     if not extracted_data:
         current_app.logger.error(f"Failed to extract CV text for user ID: {id}")
         return {"error": "Failed to extract CV text"}
 
+    if extracted_data.get('parsed') is not None:
+        return extracted_data['parsed']
+
     # Process the extracted text with AI
     parsed_cv = process_cv_with_ai(extracted_data['text'])
+    if cv_cache is not None:
+        cv_cache.store_parsed(extracted_data['pdf_hash'], parsed_cv)
 
     # Save the parsed CV to a temporary file (for debugging)
     with open('temp_extraction.txt', 'w', encoding='utf-8') as f:
@@ -28,8 +38,22 @@ def load_prompt_template():
     with open('website/static/assets/prompt.txt', 'r', encoding='utf-8') as f:
         return f.read()
 
+# The interview the demo runs; prompt.txt holds a copy of its prompt
+DEFAULT_INTERVIEW_TITLE = "Barclays"
+
 candidate_auth = Blueprint('candidate_auth', __name__)
 
+@candidate_auth.record_once
+def seed_prompt_cache(state):
+    # Warm start: logins use the local prompt until the first load from Wix replaces it
+    wix_db = state.app.extensions.get('wix_db')
+    if wix_db is None or wix_db.prompt_cache is None:
+        return
+    try:
+        wix_db.prompt_cache.seed(DEFAULT_INTERVIEW_TITLE, load_prompt_template())
+    except OSError as e:
+        state.app.logger.warning(f"Could not seed the prompt cache from prompt.txt: {str(e)}")
+
 @candidate_auth.route('/autoLogin', methods=['GET'])
 @cross_origin(supports_credentials=True)
 def autoLogin():
@@ -45,6 +69,7 @@ def autoLogin():
 
         session.clear()
         session.modified = True
+        get_conversation_log().clear()
 
         # ----------------------------------------
         # Initialize user using WixDatabase
@@ -54,8 +79,17 @@ def autoLogin():
             current_app.logger.error("WixDatabase not initialized.")
             return jsonify({"msg": "Internal server error"}), 500
 
+        # The user and the prompt template are independent, so fetch them concurrently
+        async_wix_db = current_app.extensions.get('async_wix_db')
+
+        async def load_login_data():
+            return await async_wix_db.gather(
+                async_wix_db.get_user(item_id),
+                async_wix_db.get_cached_prompt(DEFAULT_INTERVIEW_TITLE)
+            )
+
         current_app.logger.info(f"Getting user with item_id: {item_id}")
-        user = wix_db.get_user(item_id)
+        user, prompt_template = run_async(load_login_data)
         if not user:
             current_app.logger.error(f"User not found with item_id: {item_id}")
             return jsonify({"msg": "User not found"}), 404
@@ -102,10 +136,8 @@ def autoLogin():
         # ----------------------------------------
         # Get prompt template and create prompt
         # ----------------------------------------
-        try:
-            prompt_template = wix_db.get_prompt("Barclays")
-        except Exception as e:
-            current_app.logger.error(f"Error loading prompt template, using default on local storage: {str(e)}")
+        if not prompt_template:
+            current_app.logger.error("No prompt template available, using default on local storage.")
             prompt_template = load_prompt_template()
 
         prompt = prompt_template
@@ -140,49 +172,30 @@ def decode_id(encoded_id):
     decoded = ''.join(characters[(characters.index(c) - 13) % 64] if c in characters else c for c in encoded_id)
     return decoded
 
-def get_avatar(interviewType, run, avatar_data):
-    """Fetch avatars from the provided avatar_data and return the avatar matching the interviewType and run.
-    If no match is found, return the default 'avatar_1'."""
-    try:
-        for entry in avatar_data:
-            if entry['interviewType'] == interviewType and entry['run'] == run:
-                return entry['avatar']
-    except Exception as e:
-        current_app.logger.error(f"Error fetching avatar from data: {e}")
-
-    # Fallback to default avatar if no match is found
-    return "avatar_1"
+def get_avatar_config(interviewType, run):
+    """Look up avatar, voice and speech rate for the interviewType and run in the cached avatar selector index.
+    If there is no match (or the index is not loaded yet), return DEFAULT_AVATAR_CONFIG."""
+    wix_db = current_app.extensions.get('wix_db')
+    if not wix_db or not wix_db.avatar_index:
+        return DEFAULT_AVATAR_CONFIG
+    return wix_db.avatar_index.lookup(interviewType, run)
 
-def get_voice(interviewType, run, avatar_data):
-    """Fetch voice from the provided avatar_data and return the voice matching the interviewType and run.
-    If no match is found, return the default 'en-US-AvaMultilingualNeural'."""
-    try:
-        for entry in avatar_data:
-            if entry['interviewType'] == interviewType and entry['run'] == run:
-                return entry['voice']
-    except Exception as e:
-        current_app.logger.error(f"Error fetching voice from data: {e}")
+def get_avatar(interviewType, run):
+    """Return the avatar matching the interviewType and run, or the default 'avatar_1'."""
+    return get_avatar_config(interviewType, run).avatar
 
-    return "en-US-AvaMultilingualNeural"
+def get_voice(interviewType, run):
+    """Return the voice matching the interviewType and run, or the default 'en-US-AvaMultilingualNeural'."""
+    return get_avatar_config(interviewType, run).voice
 
-def get_speechSynthesisVoiceRate(interviewType, run, avatar_data):
-    """Fetch speechSynthesisVoiceRate from the provided avatar_data and return the speechSynthesisVoiceRate
-    matching the interviewType and run. If no match is found, return the default '0' (normal speed).
-    """
-    try:
-        for entry in avatar_data:
-            if entry['interviewType'] == interviewType and entry['run'] == run:
-                return entry['speechSynthesisVoiceRate']
-        current_app.logger.info(f"No speech rate match found for interviewType: {interviewType}, run: {run}. Using default value: 0")
-        return 0  # Default to normal speed if no match found
-    except Exception as e:
-        current_app.logger.error(f"Error fetching speechSynthesisVoiceRate from data: {e}")
-        return 0  # Return default value in case of any error
+def get_speechSynthesisVoiceRate(interviewType, run):
+    """Return the speechSynthesisVoiceRate matching the interviewType and run, or the default '0' (normal speed)."""
+    return get_avatar_config(interviewType, run).speech_rate
 
 @candidate_auth.route('/get_session_data')
 def get_session_data():
-    # Safely remove 'conversation_log' from session if it exists
-    session.pop('conversation_log', None)
+    # Safely reset the conversation log if it exists
+    get_conversation_log().clear()
     return jsonify(session.get('user_data', {}))
 
 @candidate_auth.route('/get_avatar')
@@ -1,32 +1,30 @@
 from flask import Blueprint, render_template, request, jsonify, session, current_app
 from flask_login import current_user
-import asyncio
-from .api_utils import stop_api_event
+from .api_utils import stop_api_event, run_async
 from flask_cors import cross_origin
 from .ai_call import AzureAIAgent
+from .conversation_log import get_conversation_log, get_async_conversation_log
+from .metrics import record_metric, metric_total
 import re
 
 agent = AzureAIAgent()
 candidate_view = Blueprint('candidate_view', __name__)
 
-def run_async(func, *args):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    return loop.run_until_complete(func(*args))
-
 async def async_record_conversation(user_input=None, response=None):
-    if 'conversation_log' not in session:
-        await agent.load_system_prompt_from_file()
+    conversation_log = get_async_conversation_log()
+    if not await conversation_log.length():
+        agent.load_system_prompt_from_file()
 
+    messages = []
     # Append user input to the conversation log if provided
     if user_input is not None:
-        session['conversation_log'].append({"role": "user", "content": user_input})
+        messages.append({"role": "user", "content": user_input})
 
     # Append response to the conversation log if provided
     if response is not None:
-        session['conversation_log'].append({"role": "assistant", "content": response})
+        messages.append({"role": "assistant", "content": response})
 
-    session.modified = True
+    await conversation_log.extend(messages)
 
 
 def process_job_title_from_response(response):
@@ -69,9 +67,10 @@ def process_job_title_from_response(response):
                         # Update coach counter with job title
                         wix_db.update_job_title(
                             item_id=session['user_data']['item_id'],
-                            new_job_title=job_title
+                            new_job_title=job_title,
+                            defer=True
                         )
-                        current_app.logger.info(f"Updated Wix DB with job title: {job_title}")
+                        current_app.logger.info(f"Queued Wix DB update with job title: {job_title}")
                     else:
                         current_app.logger.error("WixDatabase not initialized or user_ID not found.")
                 except Exception as e:
@@ -94,7 +93,7 @@ def update_usage_counter(response):
         try:
             wix_db = current_app.extensions.get('wix_db')
             if wix_db and session.get('user_data', {}).get('item_id'):
-                wix_db.update_use_count(item_id=session['user_data']['item_id'])
+                wix_db.update_use_count(item_id=session['user_data']['item_id'], defer=True)
                 current_app.logger.info(f"Updated usage counter for item ID: {session['user_data']['item_id']}")
                 return True
             else:
@@ -122,7 +121,7 @@ def interface():
                 return jsonify({"error": "Missing chat message"}), 400
             elif message == "<-START->" or message == "&lt;-START-&gt":
                 pass
-            elif isinstance(session.get('conversation_log'), list) and len(session['conversation_log']) > 1:
+            elif len(get_conversation_log()) > 1:
                 await async_record_conversation(user_input=message)
 
             response = agent.send_to_azure_agent()
@@ -175,7 +174,9 @@ def cleanup_session():
         stop_api_event()
 
         # Clear session
-        if 'conversation_log' in session:
+        conversation_log = get_conversation_log()
+        if conversation_log:
+            conversation_log.clear()
             session.clear()
             session.modified = True
 
@@ -207,13 +208,13 @@ def record_usage():
         return jsonify({'error': 'Invalid recording_seconds value'}), 400
 
     try:
-        # Add the recording duration to the total
-        session['user_metrics']['recordingsCoach'] += recording_seconds
-        session.modified = True
+        # Add the recording duration to the total, which is what Wix has plus what is not flushed yet
+        pending_seconds = record_metric('recordingsCoach', float(recording_seconds))
+        total_seconds = metric_total('recordingsCoach', pending_seconds)
         return jsonify({
             'success': True,
             'recorded_seconds': recording_seconds,
-            'total_seconds': session['user_metrics']['recordingsCoach']
+            'total_seconds': total_seconds
         })
 
     except Exception as e:
@@ -0,0 +1,68 @@
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker for calls to a remote service.
+
+    After `failure_threshold` consecutive failures the circuit opens and allow() refuses
+    every call for `reset_timeout` seconds, so callers fail fast instead of each waiting for
+    a timeout from a service that is down. Then one trial call is let through (half-open):
+    if it succeeds the circuit closes again, if it fails it stays open for another period.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30, name='circuit'):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+
+    def allow(self):
+        """
+        :return: True if a call may be made now.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let one trial call through; another one only if it has not reported back in time
+                self.state = HALF_OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """
+        :return: True if this failure opened the circuit.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                return True
+            return False
+
+    def stats(self):
+        with self.lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'open_for_seconds': round(time.monotonic() - self.opened_at, 1) if self.opened_at is not None else None,
+                'times_opened': self.times_opened,
+            }
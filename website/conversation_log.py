@@ -0,0 +1,154 @@
+from flask import current_app, session, g
+import inspect
+import json
+
+class ConversationLog:
+    """
+    List-like view of a conversation stored as a Redis list next to the session hash.
+
+    Appends are a single RPUSH (plus a TTL refresh in the same round-trip), so recording
+    a turn no longer re-serializes and re-uploads the whole transcript. Reads go through
+    LLEN/LINDEX/LRANGE, which lets callers fetch only the range they need.
+    """
+    def __init__(self, redis, key, ttl, serializer=json):
+        self.redis = redis
+        self.key = key
+        self.ttl = ttl
+        self.serializer = serializer
+
+    def __len__(self):
+        return self.redis.llen(self.key)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                return self.to_list()[index]
+            start = index.start or 0
+            if index.stop is None:
+                end = -1
+            elif index.stop == 0 or (index.stop > 0 and index.stop <= start):
+                return []
+            else:
+                end = index.stop - 1
+            return self.range(start, end)
+
+        value = self.redis.lindex(self.key, index)
+        if value is None:
+            raise IndexError("conversation log index out of range")
+        return self.serializer.loads(value)
+
+    def range(self, start=0, end=-1):
+        """
+        Returns the messages between start and end, both inclusive (Redis LRANGE semantics).
+
+        :param start: Index of the first message.
+        :param end: Index of the last message, -1 for the end of the log.
+        :return: A list of message dicts.
+        """
+        return [self.serializer.loads(value) for value in self.redis.lrange(self.key, start, end)]
+
+    def to_list(self):
+        return self.range(0, -1)
+
+    def append(self, message):
+        self.extend([message])
+
+    def extend(self, messages):
+        values = [self.serializer.dumps(message) for message in messages]
+        if not values:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(self.key, *values)
+        pipe.expire(self.key, self.ttl)
+        pipe.execute()
+
+    def reset(self, messages=()):
+        """
+        Replaces the whole log with the given messages.
+
+        :param messages: The messages the log should contain afterwards.
+        """
+        values = [self.serializer.dumps(message) for message in messages]
+        # Not a MULTI transaction, which Redis Cluster clients do not support; a single
+        # session's requests do not race on resetting its log
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(self.key)
+        if values:
+            pipe.rpush(self.key, *values)
+            pipe.expire(self.key, self.ttl)
+        pipe.execute()
+
+    def clear(self):
+        self.redis.delete(self.key)
+
+async def _resolve(result):
+    return await result if inspect.isawaitable(result) else result
+
+class AsyncConversationLog:
+    """
+    asyncio counterpart of ConversationLog for async routes.
+
+    Works with a redis.asyncio client, and also with a synchronous client when no
+    async one is configured, so callers do not need to care which they got.
+    """
+    def __init__(self, redis, key, ttl, serializer=json):
+        self.redis = redis
+        self.key = key
+        self.ttl = ttl
+        self.serializer = serializer
+
+    async def length(self):
+        return await _resolve(self.redis.llen(self.key))
+
+    async def range(self, start=0, end=-1):
+        values = await _resolve(self.redis.lrange(self.key, start, end))
+        return [self.serializer.loads(value) for value in values]
+
+    async def to_list(self):
+        return await self.range(0, -1)
+
+    async def append(self, message):
+        await self.extend([message])
+
+    async def extend(self, messages):
+        values = [self.serializer.dumps(message) for message in messages]
+        if not values:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        await _resolve(pipe.rpush(self.key, *values))
+        await _resolve(pipe.expire(self.key, self.ttl))
+        await _resolve(pipe.execute())
+
+    async def clear(self):
+        await _resolve(self.redis.delete(self.key))
+
+def get_conversation_log():
+    """
+    Returns the conversation log of the current session.
+
+    Sessions that still carry a 'conversation_log' list in the session itself are moved
+    to the Redis list the first time they are accessed.
+    """
+    if 'conversation_log' not in g:
+        conversation_log = current_app.session_interface.conversation_log(current_app, session.sid)
+        legacy_log = session.pop('conversation_log', None)
+        if isinstance(legacy_log, list) and legacy_log:
+            conversation_log.reset(legacy_log)
+        g.conversation_log = conversation_log
+    return g.conversation_log
+
+def get_async_conversation_log():
+    """
+    Returns the conversation log of the current session for use inside a coroutine.
+    Must be called from a running event loop (see api_utils.run_async).
+    """
+    interface = current_app.session_interface
+    client = interface.async_redis.get() if interface.async_redis is not None else interface.redis
+    ttl = int(current_app.permanent_session_lifetime.total_seconds())
+    return AsyncConversationLog(client, interface.conversation_key(session.sid), ttl, serializer=interface.serializer)
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import threading
+from cachetools import TTLCache
+from flask import current_app, has_app_context
+
+class CVCache:
+    """
+    Content-addressed cache of CV extraction and AI parsing results.
+
+    Entries are keyed by the SHA-256 of the PDF bytes and hold the extracted text (with its
+    token count) and, once it has been computed, the structured extract_cv_information result.
+    A Wix document URI names one uploaded file (a new upload gets a new URI), so it is kept as
+    an alias of the hash: a repeat login with an unchanged CV skips the download, pdfplumber
+    and the LLM call altogether.
+
+    Two tiers: a per-process TTL/LRU cache in front of Redis, which is shared by all workers
+    and instances. Redis errors are logged and treated as misses.
+    """
+    def __init__(self, redis=None, max_entries=256, ttl=86400, key_prefix='cv:'):
+        """
+        :param redis: Redis client for the shared tier, or None for the local tier only.
+        :param max_entries: Entries (and, separately, document aliases) kept in process.
+        :param ttl: Seconds an entry is kept in either tier.
+        """
+        self.redis = redis
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.entries = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.documents = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def hash_pdf(pdf_bytes):
+        return hashlib.sha256(pdf_bytes).hexdigest()
+
+    def get_by_document(self, document_uri):
+        """
+        :return: The entry for the PDF a Wix document URI was last seen with, or None.
+        """
+        with self.lock:
+            pdf_hash = self.documents.get(document_uri)
+        if pdf_hash is None:
+            pdf_hash = self._redis_get(self._document_key(document_uri))
+            if pdf_hash is not None:
+                with self.lock:
+                    self.documents[document_uri] = pdf_hash
+        if pdf_hash is None:
+            with self.lock:
+                self.misses += 1
+            return None
+        return self.get(pdf_hash)
+
+    def get(self, pdf_hash):
+        """
+        :return: A dict with 'pdf_hash', 'text', 'token_count' and, if the CV was parsed
+                 already, 'parsed'; or None.
+        """
+        entry = self._load(pdf_hash)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return dict(entry, pdf_hash=pdf_hash) if entry is not None else None
+
+    def store_text(self, pdf_hash, extracted, document_uri=None):
+        """
+        Stores the extracted text of a PDF, keeping a parsed result already cached for it.
+
+        :param extracted: The dict returned by extract_raw_text_from_bytes.
+        :param document_uri: The Wix document URI the PDF was downloaded for, if any.
+        """
+        entry = dict(self._load(pdf_hash) or {})
+        entry.update(text=extracted['text'], token_count=extracted['token_count'])
+        self._put(pdf_hash, entry)
+        if document_uri:
+            self.alias(document_uri, pdf_hash)
+
+    def store_parsed(self, pdf_hash, parsed):
+        """
+        Adds the extract_cv_information result to the entry of a PDF whose text is cached.
+        """
+        entry = self._load(pdf_hash)
+        if entry is None:
+            return
+        entry = dict(entry, parsed=parsed)
+        self._put(pdf_hash, entry)
+
+    def alias(self, document_uri, pdf_hash):
+        with self.lock:
+            self.documents[document_uri] = pdf_hash
+        self._redis_set(self._document_key(document_uri), pdf_hash)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'documents': len(self.documents),
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared': self.redis is not None,
+            }
+
+    def _load(self, pdf_hash):
+        with self.lock:
+            entry = self.entries.get(pdf_hash)
+        if entry is None:
+            value = self._redis_get(self._entry_key(pdf_hash))
+            entry = json.loads(value) if value is not None else None
+            if entry is not None:
+                with self.lock:
+                    self.entries[pdf_hash] = entry
+        return entry
+
+    def _put(self, pdf_hash, entry):
+        with self.lock:
+            self.entries[pdf_hash] = entry
+        self._redis_set(self._entry_key(pdf_hash), json.dumps(entry))
+
+    def _entry_key(self, pdf_hash):
+        return f'{self.key_prefix}pdf:{pdf_hash}'
+
+    def _document_key(self, document_uri):
+        # URIs contain file names of any length; hash them for a bounded key
+        return f'{self.key_prefix}doc:{hashlib.sha256(document_uri.encode("utf-8")).hexdigest()}'
+
+    def _redis_get(self, key):
+        if self.redis is None:
+            return None
+        try:
+            value = self.redis.get(key)
+        except Exception as e:
+            self._log_error(f"Error reading {key} from the CV cache: {str(e)}")
+            return None
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def _redis_set(self, key, value):
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(key, value, ex=int(self.ttl))
+        except Exception as e:
+            self._log_error(f"Error writing {key} to the CV cache: {str(e)}")
+
+    def _log_error(self, message):
+        logger = current_app.logger if has_app_context() else logging.getLogger(__name__)
+        logger.error(message)
+
+def get_cv_cache():
+    """
+    :return: The app's CVCache, or None outside an app context or if it is not configured.
+    """
+    return current_app.extensions.get('cv_cache') if has_app_context() else None
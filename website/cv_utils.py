@@ -9,15 +9,14 @@ logging.getLogger("openai").setLevel(logging.WARNING)
 logging.getLogger("azure").setLevel(logging.WARNING)
 logging.getLogger("asyncio").setLevel(logging.WARNING)
 
-import requests
-import pdfplumber
+import asyncio
 import logging
-import tiktoken
 import io
-import bleach
 import defusedxml
 from html import escape
 from .secrets import get_secret
+from .http_client import get_http_session
+from .cv_cache import CVCache, get_cv_cache
 
 # Activate defusedxml to protect against XML vulnerabilities
 defusedxml.defuse_stdlib()
@@ -33,6 +32,9 @@ def count_tokens(text, model="gpt-4"):
     Returns:
         Number of tokens
     """
+    # pdfplumber, tiktoken and bleach are imported on first use, so workers that never
+    # parse a CV do not pay for loading them
+    import tiktoken
     encoding = tiktoken.encoding_for_model(model)
     return len(encoding.encode(text))
 
@@ -54,6 +56,7 @@ def sanitize_text(text):
 
     # Clean with bleach - removing all HTML tags and potentially harmful content
     # We're stripping all tags for maximum security
+    import bleach
     cleaned_text = bleach.clean(text, tags=[], strip=True)
 
     return cleaned_text
@@ -69,14 +72,27 @@ def extract_raw_text_from_url(url):
         Dictionary with text content and token count
     """
     # Stream the PDF from the URL
-    response = requests.get(url)
+    response = get_http_session().get(url)
     response.raise_for_status()  # Ensure we got a valid response
 
+    return extract_raw_text_from_bytes(response.content)
+
+def extract_raw_text_from_bytes(pdf_bytes):
+    """
+    Extract text from PDF content already in memory.
+
+    Args:
+        pdf_bytes: The PDF file content
+
+    Returns:
+        Dictionary with text content and token count
+    """
     # Create an in-memory binary stream
-    pdf_file_object = io.BytesIO(response.content)
+    pdf_file_object = io.BytesIO(pdf_bytes)
 
     # Process the PDF using the in-memory stream
     try:
+        import pdfplumber
         with pdfplumber.open(pdf_file_object) as pdf:
             text = ""
             for page in pdf.pages:
@@ -95,6 +111,33 @@ def extract_raw_text_from_url(url):
         logging.error(f"Error extracting text from PDF: {str(e)}")
         raise ValueError("Error processing your PDF. Please ensure it's a valid document.")
 
+def extract_text_cached(pdf_bytes, cv_cache=None, document_uri=None):
+    """
+    Extract text from PDF content, reusing the result cached for identical content.
+
+    Args:
+        pdf_bytes: The PDF file content
+        cv_cache: Optional CVCache to look the PDF up in and store the result to
+        document_uri: The Wix document URI the PDF was downloaded for, if any
+
+    Returns:
+        Dictionary with text content, token count and the PDF's hash ('pdf_hash'), plus the
+        parsed CV ('parsed') if that is cached too
+    """
+    pdf_hash = CVCache.hash_pdf(pdf_bytes)
+    if cv_cache is not None:
+        cached = cv_cache.get(pdf_hash)
+        if cached is not None:
+            # Same file uploaded again under a new document URI
+            if document_uri:
+                cv_cache.alias(document_uri, pdf_hash)
+            return cached
+
+    extracted = extract_raw_text_from_bytes(pdf_bytes)
+    if cv_cache is not None:
+        cv_cache.store_text(pdf_hash, extracted, document_uri)
+    return dict(extracted, pdf_hash=pdf_hash)
+
 def get_file_url_from_wix_document(document_uri, api_key=None, site_id=None):
     """
     Converts a Wix document URI to an accessible URL.
@@ -135,7 +178,7 @@ def get_file_url_from_wix_document(document_uri, api_key=None, site_id=None):
     }
 
     try:
-        response = requests.get(url, headers=headers)
+        response = get_http_session().get(url, headers=headers)
         response.raise_for_status()
 
         result = response.json()
@@ -158,7 +201,7 @@ def get_file_url_from_wix_document(document_uri, api_key=None, site_id=None):
     }
 
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = get_http_session().post(url, headers=headers, json=data)
         response.raise_for_status()
 
         result = response.json()
@@ -171,7 +214,7 @@ def get_file_url_from_wix_document(document_uri, api_key=None, site_id=None):
     # 3. Try the file download URL API
     try:
         file_url = f"https://www.wixapis.com/site-media/v1/files/{document_id}/download-url"
-        response = requests.get(file_url, headers={
+        response = get_http_session().get(file_url, headers={
             'Authorization': api_key,
             'wix-site-id': site_id
         })
@@ -225,7 +268,7 @@ def fetch_wix_cv_data(user_id):
     }
 
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = get_http_session().post(url, headers=headers, json=data)
         response.raise_for_status()
 
         result = response.json()
@@ -267,6 +310,13 @@ def get_cv_text(user_id):
         logging.error(f"Could not fetch document URI for user {user_id}")
         return None
 
+    # An unchanged CV was extracted before
+    cv_cache = get_cv_cache()
+    if cv_cache is not None and isinstance(document_uri, str):
+        cached = cv_cache.get_by_document(document_uri)
+        if cached is not None:
+            return cached
+
     # Step 2: Check if it's a Wix document URI and convert to URL
     if isinstance(document_uri, str) and document_uri.startswith('wix:document://'):
         file_url = get_file_url_from_wix_document(document_uri, api_key, site_id)
@@ -277,11 +327,56 @@ def get_cv_text(user_id):
 
         # Step 3: Extract text from the PDF with security measures
         try:
-            pdf_data = extract_raw_text_from_url(file_url)
-            return pdf_data
+            response = get_http_session().get(file_url)
+            response.raise_for_status()
+            return extract_text_cached(response.content, cv_cache, document_uri)
         except Exception as e:
             logging.error(f"Error extracting text from PDF: {str(e)}")
             return None
     else:
         logging.error(f"Unexpected CV data format: {document_uri}")
         return None
+
+async def async_get_cv_text(user_id, async_wix_db, cv_cache=None):
+    """
+    asyncio version of get_cv_text.
+
+    The Wix calls run on the event loop (see AsyncWixDatabase), and the PDF is parsed in a
+    worker thread so the event loop is not blocked.
+
+    Args:
+        user_id: The user ID to get CV text for
+        async_wix_db: The AsyncWixDatabase to make the Wix calls with
+        cv_cache: Optional CVCache; an unchanged CV is then neither downloaded nor parsed again
+
+    Returns:
+        Dictionary as returned by extract_text_cached if successful, None otherwise
+    """
+    document_uri = await async_wix_db.get_cv_document_uri(user_id)
+    if not document_uri:
+        logging.error(f"Could not fetch document URI for user {user_id}")
+        return None
+
+    if not (isinstance(document_uri, str) and document_uri.startswith('wix:document://')):
+        logging.error(f"Unexpected CV data format: {document_uri}")
+        return None
+
+    if cv_cache is not None:
+        cached = cv_cache.get_by_document(document_uri)
+        if cached is not None:
+            return cached
+
+    file_url = await async_wix_db.get_file_url(document_uri)
+    if not file_url:
+        logging.error("Failed to get an accessible URL for the document")
+        return None
+
+    pdf_bytes = await async_wix_db.download(file_url)
+    if pdf_bytes is None:
+        return None
+
+    try:
+        return await asyncio.to_thread(extract_text_cached, pdf_bytes, cv_cache, document_uri)
+    except Exception as e:
+        logging.error(f"Error extracting text from PDF: {str(e)}")
+        return None
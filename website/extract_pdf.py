@@ -1,8 +1,8 @@
 import pdfplumber
 import logging
 import tiktoken
-import requests
 import io
+from .http_client import get_http_session
 
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
@@ -15,7 +15,7 @@ def extract_raw_text_from_url(url):
     Extract text from a PDF URL without saving to disk
     """
     # Stream the PDF from the URL
-    response = requests.get(url)
+    response = get_http_session().get(url)
     response.raise_for_status()  # Ensure we got a valid response
 
     # Create an in-memory binary stream
@@ -0,0 +1,44 @@
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connections kept open per host, overridable through the environment. Requests beyond the
+# pool size still go through, they just open (and then drop) an extra connection.
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+# (connect, read) timeouts in seconds for every call made through the shared session
+HTTP_TIMEOUT = (float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05)), float(os.environ.get('HTTP_READ_TIMEOUT', 20)))
+
+class PooledSession(requests.Session):
+    """
+    requests.Session that applies HTTP_TIMEOUT to every request that does not pass its own.
+    """
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', HTTP_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """
+    Returns the process-wide HTTP session used for all calls to Wix.
+
+    Connections to wixapis.com (and the file CDN the CVs are downloaded from) are kept alive
+    and reused, so a chat turn pays the TCP and TLS handshake once per connection instead of
+    once per call. The underlying urllib3 pools are thread-safe, the session ignores
+    response cookies and callers pass their auth headers per request.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = PooledSession()
+                # Shared between all users and threads, so never keep cookies from responses
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
@@ -0,0 +1,317 @@
+from collections import OrderedDict, Counter
+from redis.exceptions import ResponseError
+import threading
+import time
+
+WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+def _bytes(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    if isinstance(value, float):
+        return repr(value).encode('utf-8')
+    return str(value).encode('utf-8')
+
+def _key(key):
+    return key.decode('utf-8') if isinstance(key, bytes) else key
+
+class MemoryRedis:
+    """
+    In-process stand-in for the subset of the Redis API the app uses (strings, hashes,
+    sets, lists, TTLs and pipelines), for benchmarks, load tests and local runs without Redis.
+
+    Keys expire like in Redis and the least recently used keys are evicted once more than
+    `max_keys` are stored. Replies match a redis-py client with decode_responses=False.
+    Every direct command and every pipeline execution counts as one round-trip in `stats()`,
+    which makes it easy to see how many Redis calls a request path would cost.
+    """
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.data = OrderedDict()  # key -> (type, value)
+        self.expires = {}          # key -> monotonic deadline
+        self.lock = threading.RLock()
+        self.commands = Counter()
+        self.round_trips = 0
+        self.evictions = 0
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _lookup(self, key, kind):
+        key = _key(key)
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[0] != kind:
+            raise ResponseError(WRONGTYPE)
+        self.data.move_to_end(key)
+        return entry[1]
+
+    def _create(self, key, kind, value):
+        key = _key(key)
+        self.data[key] = (kind, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_keys:
+            evicted, _ = self.data.popitem(last=False)
+            self.expires.pop(evicted, None)
+            self.evictions += 1
+        return value
+
+    def _container(self, key, kind, factory):
+        value = self._lookup(key, kind)
+        if value is None:
+            value = self._create(key, kind, factory())
+        return value
+
+    def _drop_if_empty(self, key, value):
+        if not value:
+            self.data.pop(_key(key), None)
+            self.expires.pop(_key(key), None)
+
+    def _run(self, name, *args, **kwargs):
+        with self.lock:
+            self.commands[name] += 1
+            return getattr(self, f'_cmd_{name}')(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('_cmd_') or not hasattr(type(self), f'_cmd_{name}'):
+            raise AttributeError(name)
+
+        def command(*args, **kwargs):
+            with self.lock:
+                self.round_trips += 1
+            return self._run(name, *args, **kwargs)
+        return command
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return MemoryPipeline(self)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'keys': len(self.data),
+                'round_trips': self.round_trips,
+                'evictions': self.evictions,
+                'commands': dict(self.commands),
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.commands.clear()
+            self.round_trips = 0
+            self.evictions = 0
+
+    # ----------------------------------------
+    # Keys and strings
+    # ----------------------------------------
+    def _cmd_ping(self):
+        return True
+
+    def _cmd_get(self, key):
+        return self._lookup(key, 'string')
+
+    def _cmd_set(self, key, value, ex=None):
+        self.data.pop(_key(key), None)
+        self.expires.pop(_key(key), None)
+        self._create(key, 'string', _bytes(value))
+        if ex is not None:
+            self._cmd_expire(key, ex)
+        return True
+
+    def _cmd_setex(self, name, time, value):
+        return self._cmd_set(name, value, ex=time)
+
+    def _cmd_delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._lookup_any(key):
+                self.data.pop(_key(key), None)
+                self.expires.pop(_key(key), None)
+                deleted += 1
+        return deleted
+
+    def _cmd_rename(self, src, dst):
+        if not self._lookup_any(src):
+            raise ResponseError("no such key")
+        kind, value = self.data.pop(_key(src))
+        deadline = self.expires.pop(_key(src), None)
+        self.data.pop(_key(dst), None)
+        self.expires.pop(_key(dst), None)
+        self._create(dst, kind, value)
+        if deadline is not None:
+            self.expires[_key(dst)] = deadline
+        return True
+
+    def _cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._lookup_any(key))
+
+    def _lookup_any(self, key):
+        entry = self.data.get(_key(key))
+        return entry is not None and self._lookup(key, entry[0]) is not None
+
+    def _cmd_expire(self, key, seconds):
+        if not self._lookup_any(key):
+            return False
+        self.expires[_key(key)] = time.monotonic() + int(seconds)
+        return True
+
+    def _cmd_ttl(self, key):
+        if not self._lookup_any(key):
+            return -2
+        deadline = self.expires.get(_key(key))
+        return -1 if deadline is None else max(int(deadline - time.monotonic()), 0)
+
+    def _cmd_flushall(self):
+        self.data.clear()
+        self.expires.clear()
+        return True
+
+    # ----------------------------------------
+    # Hashes
+    # ----------------------------------------
+    def _cmd_hgetall(self, key):
+        value = self._lookup(key, 'hash')
+        return {field.encode('utf-8'): item for field, item in (value or {}).items()}
+
+    def _cmd_hget(self, key, field):
+        return (self._lookup(key, 'hash') or {}).get(_key(field))
+
+    def _cmd_hset(self, key, field=None, value=None, mapping=None):
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        hash_value = self._container(key, 'hash', dict)
+        added = 0
+        for item_field, item_value in items.items():
+            item_field = _key(item_field)
+            added += item_field not in hash_value
+            hash_value[item_field] = _bytes(item_value)
+        return added
+
+    def _cmd_hdel(self, key, *fields):
+        hash_value = self._lookup(key, 'hash')
+        if hash_value is None:
+            return 0
+        removed = sum(1 for field in fields if hash_value.pop(_key(field), None) is not None)
+        self._drop_if_empty(key, hash_value)
+        return removed
+
+    def _cmd_hincrby(self, key, field, amount=1):
+        hash_value = self._container(key, 'hash', dict)
+        new_value = int(hash_value.get(_key(field), b'0')) + int(amount)
+        hash_value[_key(field)] = _bytes(new_value)
+        return new_value
+
+    def _cmd_hincrbyfloat(self, key, field, amount=1.0):
+        hash_value = self._container(key, 'hash', dict)
+        new_value = float(hash_value.get(_key(field), b'0')) + float(amount)
+        hash_value[_key(field)] = _bytes(new_value)
+        return new_value
+
+    # ----------------------------------------
+    # Sets
+    # ----------------------------------------
+    def _cmd_sadd(self, key, *members):
+        set_value = self._container(key, 'set', set)
+        added = {_bytes(member) for member in members} - set_value
+        set_value.update(added)
+        return len(added)
+
+    def _cmd_srem(self, key, *members):
+        set_value = self._lookup(key, 'set')
+        if set_value is None:
+            return 0
+        removed = {_bytes(member) for member in members} & set_value
+        set_value.difference_update(removed)
+        self._drop_if_empty(key, set_value)
+        return len(removed)
+
+    def _cmd_spop(self, key, count=None):
+        set_value = self._lookup(key, 'set')
+        if not set_value:
+            return [] if count is not None else None
+        popped = [set_value.pop() for _ in range(min(count or 1, len(set_value)))]
+        self._drop_if_empty(key, set_value)
+        return popped if count is not None else popped[0]
+
+    def _cmd_smembers(self, key):
+        return set(self._lookup(key, 'set') or ())
+
+    def _cmd_scard(self, key):
+        return len(self._lookup(key, 'set') or ())
+
+    # ----------------------------------------
+    # Lists
+    # ----------------------------------------
+    def _cmd_rpush(self, key, *values):
+        list_value = self._container(key, 'list', list)
+        list_value.extend(_bytes(value) for value in values)
+        return len(list_value)
+
+    def _cmd_llen(self, key):
+        return len(self._lookup(key, 'list') or [])
+
+    def _cmd_lindex(self, key, index):
+        list_value = self._lookup(key, 'list') or []
+        try:
+            return list_value[index]
+        except IndexError:
+            return None
+
+    def _cmd_lrange(self, key, start, end):
+        list_value = self._lookup(key, 'list') or []
+        length = len(list_value)
+        if start < 0:
+            start = max(length + start, 0)
+        if end < 0:
+            end = length + end
+            if end < 0:
+                # Like Redis: an end before the first element selects nothing
+                return []
+        return list(list_value[start:end + 1])
+
+class MemoryPipeline:
+    """
+    Queues commands and runs them under the store lock on execute(), counted as one round-trip.
+    Like a Redis pipeline with raise_on_error, the first failing command raises after all ran.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.queued = []
+
+    def __getattr__(self, name):
+        if not hasattr(type(self.store), f'_cmd_{name}'):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+            return self
+        return queue
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.queued = []
+
+    def execute(self, raise_on_error=True):
+        results = []
+        with self.store.lock:
+            self.store.round_trips += 1
+            for name, args, kwargs in self.queued:
+                try:
+                    results.append(self.store._run(name, *args, **kwargs))
+                except ResponseError as e:
+                    results.append(e)
+        self.queued = []
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, ResponseError):
+                    raise result
+        return results
@@ -0,0 +1,216 @@
+from flask import current_app, session
+import atexit
+import os
+import threading
+import uuid
+
+# Deltas this close to zero are float noise left over from HINCRBYFLOAT, not real usage
+EPSILON = 1e-9
+# A hash taken by a flush that then crashed is dropped after this long
+CLAIM_TTL = 7 * 86400
+
+class MetricsAggregator:
+    """
+    Per-user usage counters, accumulated in Redis and flushed to the Wix 'metrics' collection.
+
+    increment() is a single pipelined HINCRBY/HINCRBYFLOAT on the user's hash plus an SADD
+    to the set of users with unflushed deltas, so counting is cheap on the request path and
+    correct under concurrent requests from any worker.
+
+    A background thread flushes every `flush_interval` seconds. Each flush claims users from
+    the dirty set with SPOP and takes their hashes with an atomic RENAME to a key of its own,
+    so increments made from then on start a new hash and no other flush can read the taken
+    deltas, even one that picks up the same user again. Taken hashes are deleted once Wix has
+    stored them; deltas that could not be sent are added back and the user is marked dirty
+    again. Only a worker crashing in the middle of a flush loses that flush's deltas.
+    """
+    def __init__(self, redis, wix_db, app, key_prefix='metrics:', flush_interval=60, batch_size=100, hash_tag=False):
+        """
+        :param hash_tag: Wrap the user ID in {...}, so that on Redis Cluster a user's hash and
+                         the key it is renamed to by a flush are in the same slot.
+        """
+        self.redis = redis
+        self.wix_db = wix_db
+        self.app = app
+        self.key_prefix = key_prefix
+        self.hash_tag = hash_tag
+        self.dirty_key = f'{key_prefix}dirty'
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+        self.worker = None
+        self.worker_pid = None
+        self.worker_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def user_key(self, user_id):
+        return f'{self.key_prefix}{{{user_id}}}' if self.hash_tag else f'{self.key_prefix}{user_id}'
+
+    def increment(self, user_id, name, amount=1):
+        """
+        Adds to a user's counter.
+
+        :param user_id: The user_ID the metrics are stored under in Wix.
+        :param name: The metric field name, e.g. 'playStopPressesCoach'.
+        :param amount: An int or float to add.
+        :return: The counter's value since the last flush.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        if isinstance(amount, float):
+            pipe.hincrbyfloat(self.user_key(user_id), name, amount)
+        else:
+            pipe.hincrby(self.user_key(user_id), name, amount)
+        pipe.sadd(self.dirty_key, user_id)
+        value = pipe.execute()[0]
+        self._ensure_worker()
+        return value
+
+    def pending(self, user_id):
+        """
+        :return: The user's deltas that have not been flushed to Wix yet.
+        """
+        return self._parse(self.redis.hgetall(self.user_key(user_id)))
+
+    def total(self, user_id, name, pending=None):
+        """
+        :param pending: The counter's unflushed value, if the caller has it already.
+        :return: The user's running total of a counter: the value stored in Wix plus what has
+                 not been flushed yet. While a flush of the user is under way, the delta it
+                 carries can briefly be counted in both.
+        """
+        if pending is None:
+            pending = self.pending(user_id).get(name, 0)
+        stored = (self.wix_db.get_user_metrics(user_id, fields=[name]) or {}).get(name)
+        if not isinstance(stored, (int, float)) or isinstance(stored, bool):
+            stored = 0
+        return stored + pending
+
+    def flush(self):
+        """
+        Sends the deltas of every dirty user to Wix, batch_size users per request.
+
+        :return: The number of users flushed.
+        """
+        flushed = 0
+        failed = []
+        while True:
+            user_ids = [self._text(user_id) for user_id in self.redis.spop(self.dirty_key, self.batch_size) or []]
+            if not user_ids:
+                break
+            stored, not_stored = self._flush_users(user_ids)
+            flushed += stored
+            failed += not_stored
+        if failed:
+            # Put back only now, so this flush does not pick them up again
+            self.redis.sadd(self.dirty_key, *failed)
+            current_app.logger.warning(f"{len(failed)} users' metrics were not flushed, retrying next time.")
+        return flushed
+
+    def close(self):
+        """
+        Stops the flusher and flushes once more. Registered with atexit.
+        """
+        self.stop_event.set()
+        if self.worker is not None and self.worker_pid == os.getpid():
+            self.worker.join(timeout=5)
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            self.app.logger.error(f"Error flushing metrics on shutdown: {str(e)}")
+
+    def _flush_users(self, user_ids):
+        # Take each user's hash; a RENAME fails (and is skipped) if there is nothing to take
+        claim = uuid.uuid4().hex
+        claimed_keys = {user_id: f'{self.user_key(user_id)}:flushing:{claim}' for user_id in user_ids}
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id, claimed_key in claimed_keys.items():
+            pipe.rename(self.user_key(user_id), claimed_key)
+            pipe.expire(claimed_key, CLAIM_TTL)
+        taken = [user_id for user_id, result in zip(user_ids, pipe.execute(raise_on_error=False)[::2])
+                 if not isinstance(result, Exception)]
+        if not taken:
+            return 0, []
+
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in taken:
+            pipe.hgetall(claimed_keys[user_id])
+        deltas = {}
+        for user_id, values in zip(taken, pipe.execute()):
+            values = {name: value for name, value in self._parse(values).items() if abs(value) > EPSILON}
+            if values:
+                deltas[user_id] = values
+
+        stored = set()
+        if deltas:
+            try:
+                stored = self.wix_db.increment_user_metrics(deltas)
+            except Exception as e:
+                current_app.logger.error(f"Error flushing metrics to Wix: {str(e)}")
+
+        # Give unsent deltas back, on top of anything counted since they were taken
+        failed = [user_id for user_id in deltas if user_id not in stored]
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in failed:
+            for name, value in deltas[user_id].items():
+                if isinstance(value, float):
+                    pipe.hincrbyfloat(self.user_key(user_id), name, value)
+                else:
+                    pipe.hincrby(self.user_key(user_id), name, value)
+        for claimed_key in claimed_keys.values():
+            pipe.delete(claimed_key)
+        pipe.execute()
+        return len(stored), failed
+
+    def _ensure_worker(self):
+        # Started lazily, and again after a fork, since threads do not survive into the child
+        if self.worker is not None and self.worker_pid == os.getpid() and self.worker.is_alive():
+            return
+        with self.worker_lock:
+            if self.worker is None or self.worker_pid != os.getpid() or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+                self.worker_pid = os.getpid()
+                self.worker.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                self.app.logger.error(f"Error in metrics flusher: {str(e)}")
+
+    def _parse(self, values):
+        parsed = {}
+        for name, value in (values or {}).items():
+            value = self._text(value)
+            parsed[self._text(name)] = float(value) if '.' in value or 'e' in value else int(value)
+        return parsed
+
+    def _text(self, value):
+        return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+
+def record_metric(name, amount=1):
+    """
+    Adds to a usage counter of the logged-in user. Does nothing without a user in the session.
+
+    :return: The counter's value since the last flush, or None if nothing was recorded.
+    """
+    metrics = current_app.extensions.get('metrics')
+    user_id = session.get('user_data', {}).get('user_id')
+    if metrics is None or not user_id:
+        current_app.logger.debug(f"Metric {name} not recorded, no metrics service or user in session.")
+        return None
+    return metrics.increment(user_id, name, amount)
+
+def metric_total(name, pending=None):
+    """
+    The running total of a usage counter of the logged-in user, see MetricsAggregator.total.
+
+    :return: The total, or None without a metrics service or user in the session.
+    """
+    metrics = current_app.extensions.get('metrics')
+    user_id = session.get('user_data', {}).get('user_id')
+    if metrics is None or not user_id:
+        return None
+    return metrics.total(user_id, name, pending)
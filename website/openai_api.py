@@ -1,4 +1,3 @@
-from openai import AzureOpenAI
 from .secrets import get_secret
 import re
 import threading
@@ -9,19 +8,26 @@ from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import time
 from .api_utils import is_stop_event_set
 
-interviewer_id = get_secret('INTERVIEWER-US')
-assistant_id = get_secret('ASSISTANT-US')
-analyzer_id = get_secret('ANALYZER-US')
-
-AzureClient = AzureOpenAI(   
-    api_key=get_secret('KEY1-AI-US'),  
-    api_version="2024-02-15-preview",
-    azure_endpoint = get_secret('AI-ENDPOINT-US')
-)
+_azure_client = None
+_azure_client_lock = threading.Lock()
+
+def get_azure_client():
+    # Built on first use, so importing this module does not call Key Vault
+    global _azure_client
+    if _azure_client is None:
+        with _azure_client_lock:
+            if _azure_client is None:
+                from openai import AzureOpenAI
+                _azure_client = AzureOpenAI(
+                    api_key=get_secret('KEY1-AI-US'),
+                    api_version="2024-02-15-preview",
+                    azure_endpoint = get_secret('AI-ENDPOINT-US')
+                )
+    return _azure_client
 
 def initialize_thread():
     # Create a thread and return its ID
-    thread = AzureClient.beta.threads.create()
+    thread = get_azure_client().beta.threads.create()
     return thread.id
 
 def delete_thread(thread_id):
@@ -29,7 +35,7 @@ def delete_thread(thread_id):
         print("thread not set")
         return
     try:
-        response = AzureClient.beta.threads.delete(thread_id)
+        response = get_azure_client().beta.threads.delete(thread_id)
         return response
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -56,7 +62,7 @@ def extract_segments(text):
 
 def interviewer_response(thread_id, question, assistant_instructions=None):
     try:
-        message = AzureClient.beta.threads.messages.create(
+        message = get_azure_client().beta.threads.messages.create(
             thread_id=thread_id,
             role="user",
             content=question
@@ -69,30 +75,30 @@ def interviewer_response(thread_id, question, assistant_instructions=None):
         if assistant_instructions:
             run_args["instructions"] = assistant_instructions
 
-        run = AzureClient.beta.threads.runs.create(**run_args)
+        run = get_azure_client().beta.threads.runs.create(**run_args)
         run_id = run.id
 
         start_time = time.time()
         while time.time() - start_time < 60:  # 60-second timeout for run completion
             if is_stop_event_set():
                 try:
-                    current_run = AzureClient.beta.threads.runs.retrieve(
+                    current_run = get_azure_client().beta.threads.runs.retrieve(
                         thread_id=thread_id,
                         run_id=run_id
                     )
                     if current_run.status != "completed":
-                        AzureClient.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+                        get_azure_client().beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
                 except Exception as e:
                     # If we can't cancel, it's likely already completed or cancelled
                     pass
                 return None, None, None
             
-            current_run = AzureClient.beta.threads.runs.retrieve(
+            current_run = get_azure_client().beta.threads.runs.retrieve(
                 thread_id=thread_id,
                 run_id=run_id
             )
             if current_run.status == "completed":
-                thread_messages = AzureClient.beta.threads.messages.list(thread_id)
+                thread_messages = get_azure_client().beta.threads.messages.list(thread_id)
                 for message in thread_messages.data:
                     if message.role == "assistant":
                         video_variable, response_text, question_text = extract_segments(message.content[0].text.value)
@@ -109,7 +115,7 @@ def interviewer_response(thread_id, question, assistant_instructions=None):
 
 def assistant_response(thread_id, question, assistant_instructions=None):
     try:
-        message = AzureClient.beta.threads.messages.create(
+        message = get_azure_client().beta.threads.messages.create(
             thread_id=thread_id,
             role="user",
             content=question
@@ -117,35 +123,35 @@ def assistant_response(thread_id, question, assistant_instructions=None):
 
         run_args = {
             "thread_id": thread_id,
-            "assistant_id": assistant_id
+            "assistant_id": get_secret('ASSISTANT-US')
         }
         if assistant_instructions:
             run_args["instructions"] = assistant_instructions
 
-        run = AzureClient.beta.threads.runs.create(**run_args)
+        run = get_azure_client().beta.threads.runs.create(**run_args)
         run_id = run.id
 
         start_time = time.time()
         while time.time() - start_time < 60:  # 60-second timeout for run completion
             if is_stop_event_set():
                 try:
-                    current_run = AzureClient.beta.threads.runs.retrieve(
+                    current_run = get_azure_client().beta.threads.runs.retrieve(
                         thread_id=thread_id,
                         run_id=run_id
                     )
                     if current_run.status != "completed":
-                        AzureClient.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+                        get_azure_client().beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
                 except Exception as e:
                     # If we can't cancel, it's likely already completed or cancelled
                     pass
                 return None, None, None
 
-            current_run = AzureClient.beta.threads.runs.retrieve(
+            current_run = get_azure_client().beta.threads.runs.retrieve(
                 thread_id=thread_id,
                 run_id=run_id
             )
             if current_run.status == "completed":
-                thread_messages = AzureClient.beta.threads.messages.list(thread_id)
+                thread_messages = get_azure_client().beta.threads.messages.list(thread_id)
                 for message in thread_messages.data:
                     if message.role == "assistant":
                         video_variable, response_text, question_text = extract_segments(message.content[0].text.value)
@@ -173,7 +179,7 @@ def analyze_candidate(thread_id, transcript):
         with app.app_context():
             try:
                 transcript = str(transcript)
-                message = AzureClient.beta.threads.messages.create(
+                message = get_azure_client().beta.threads.messages.create(
                     thread_id=thread_id,
                     role="user",
                     content=transcript
@@ -181,17 +187,17 @@ def analyze_candidate(thread_id, transcript):
 
                 run_args = {
                     "thread_id": thread_id,
-                    "assistant_id": analyzer_id
+                    "assistant_id": get_secret('ANALYZER-US')
                 }
    
-                run = AzureClient.beta.threads.runs.create(**run_args) 
+                run = get_azure_client().beta.threads.runs.create(**run_args) 
                 current_app.logger.debug(f"Run created for thread {thread_id}")
 
                 while True:
                     if local_stop_event.is_set():
                         return {'result': None, 'error': "Analysis stopped due to timeout"}
 
-                    current_run = AzureClient.beta.threads.runs.retrieve(
+                    current_run = get_azure_client().beta.threads.runs.retrieve(
                         thread_id=thread_id,
                         run_id=run.id
                     )
@@ -205,7 +211,7 @@ def analyze_candidate(thread_id, transcript):
                     
                     time.sleep(1)  # Add a small delay to prevent excessive API calls
 
-                thread_messages = AzureClient.beta.threads.messages.list(thread_id)
+                thread_messages = get_azure_client().beta.threads.messages.list(thread_id)
 
                 output = ""  # Initialize output as an empty string
                 for message in thread_messages.data:
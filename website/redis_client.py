@@ -0,0 +1,152 @@
+import asyncio
+import os
+import weakref
+from urllib.parse import urlparse
+import redis
+import redis.asyncio
+import redis.asyncio.connection
+from redis.cluster import RedisCluster
+from redis.asyncio.cluster import RedisCluster as AsyncRedisCluster
+from redis.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.asyncio.retry import Retry as AsyncRetry
+from .memory_redis import MemoryRedis
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+SESSION_BACKENDS = ('redis', 'local', 'memory', 'fakeredis')
+
+def configure_redis_pool(app):
+    """
+    Sets the connection pool defaults, overridable through the environment.
+
+    REDIS_MAX_CONNECTIONS bounds the pool per worker, REDIS_POOL_TIMEOUT is how long a request
+    waits for a free connection before failing, REDIS_SOCKET_TIMEOUT and
+    REDIS_SOCKET_CONNECT_TIMEOUT bound individual commands, and REDIS_HEALTH_CHECK_INTERVAL
+    pings connections that have been idle longer than that many seconds before reuse.
+    """
+    app.config.setdefault('REDIS_MAX_CONNECTIONS', int(os.environ.get('REDIS_MAX_CONNECTIONS', 50)))
+    app.config.setdefault('REDIS_POOL_TIMEOUT', float(os.environ.get('REDIS_POOL_TIMEOUT', 5)))
+    app.config.setdefault('REDIS_SOCKET_TIMEOUT', float(os.environ.get('REDIS_SOCKET_TIMEOUT', 5)))
+    app.config.setdefault('REDIS_SOCKET_CONNECT_TIMEOUT', float(os.environ.get('REDIS_SOCKET_CONNECT_TIMEOUT', 3)))
+    app.config.setdefault('REDIS_HEALTH_CHECK_INTERVAL', int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30)))
+    # Connect to a Redis Cluster (e.g. clustered Azure Cache) and shard sessions across it by sid
+    app.config.setdefault('REDIS_CLUSTER', os.environ.get('REDIS_CLUSTER', 'false').lower() == 'true')
+
+def connection_kwargs(app, host, port, password, ssl=True):
+    return {
+        'host': host,
+        'port': port,
+        'password': password,
+        'ssl': ssl,
+        'decode_responses': False,  # session values are binary (msgpack, optionally compressed)
+        'socket_keepalive': True,
+        'socket_timeout': app.config['REDIS_SOCKET_TIMEOUT'],
+        'socket_connect_timeout': app.config['REDIS_SOCKET_CONNECT_TIMEOUT'],
+        'health_check_interval': app.config['REDIS_HEALTH_CHECK_INTERVAL'],
+        'retry_on_timeout': True,
+    }
+
+def create_redis_client(app, host, port, password, ssl=True):
+    """
+    Creates the synchronous Redis client backed by a bounded, blocking connection pool.
+    Requests wait up to REDIS_POOL_TIMEOUT for a connection instead of opening unbounded
+    new ones under burst load. With REDIS_CLUSTER a cluster client is returned instead.
+    """
+    kwargs = connection_kwargs(app, host, port, password, ssl)
+    # Start with 0.1s, increase exponentially, cap at 1s
+    retry = Retry(retries=3, backoff=ExponentialBackoff(cap=1, base=0.1))
+    if app.config['REDIS_CLUSTER']:
+        return RedisCluster(max_connections=app.config['REDIS_MAX_CONNECTIONS'], retry=retry, **kwargs)
+
+    kwargs.pop('ssl')
+    pool = redis.BlockingConnectionPool(
+        connection_class=redis.SSLConnection if ssl else redis.Connection,
+        max_connections=app.config['REDIS_MAX_CONNECTIONS'],
+        timeout=app.config['REDIS_POOL_TIMEOUT'],
+        retry=retry,
+        **kwargs
+    )
+    return redis.Redis(connection_pool=pool)
+
+class AsyncRedisClients:
+    """
+    Hands out redis.asyncio clients for async routes, one per event loop.
+
+    asyncio connections belong to the loop that opened them, so each loop (there is one
+    per worker thread, see api_utils.run_async) gets its own pool with the same settings
+    as the synchronous client.
+    """
+    def __init__(self, app, host, port, password, ssl=True):
+        self.kwargs = connection_kwargs(app, host, port, password, ssl)
+        self.cluster = app.config['REDIS_CLUSTER']
+        if not self.cluster:
+            self.kwargs.pop('ssl')
+        self.ssl = ssl
+        self.max_connections = app.config['REDIS_MAX_CONNECTIONS']
+        self.pool_timeout = app.config['REDIS_POOL_TIMEOUT']
+        self.clients = weakref.WeakKeyDictionary()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        client = self.clients.get(loop)
+        if client is None and self.cluster:
+            kwargs = dict(self.kwargs)
+            kwargs.pop('retry_on_timeout')  # the asyncio cluster client retries via its own settings
+            client = AsyncRedisCluster(max_connections=self.max_connections, **kwargs)
+            self.clients[loop] = client
+        elif client is None:
+            pool = redis.asyncio.BlockingConnectionPool(
+                connection_class=redis.asyncio.connection.SSLConnection if self.ssl else redis.asyncio.connection.Connection,
+                max_connections=self.max_connections,
+                timeout=self.pool_timeout,
+                retry=AsyncRetry(retries=3, backoff=ExponentialBackoff(cap=1, base=0.1)),
+                **self.kwargs
+            )
+            client = redis.asyncio.Redis(connection_pool=pool)
+            self.clients[loop] = client
+        return client
+
+def configure_session_backend(app):
+    """
+    Sets the session store defaults, overridable through the environment.
+
+    SESSION_BACKEND selects where sessions live:
+      'redis'     - Azure Cache for Redis (the default, password from Key Vault 'KEY1-REDIS')
+      'local'     - any Redis-compatible server at REDIS_URL, e.g. redis-server on a laptop
+      'memory'    - an in-process store with LRU and TTL eviction (see memory_redis.MemoryRedis)
+      'fakeredis' - fakeredis, when installed
+    The 'memory' and 'fakeredis' stores are per process, so they only suit a single worker.
+    """
+    app.config.setdefault('SESSION_BACKEND', os.environ.get('SESSION_BACKEND', 'redis').lower())
+    app.config.setdefault('REDIS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    app.config.setdefault('SESSION_MEMORY_MAX_KEYS', int(os.environ.get('SESSION_MEMORY_MAX_KEYS', 100000)))
+    if app.config['SESSION_BACKEND'] not in SESSION_BACKENDS:
+        raise ValueError(f"Unknown SESSION_BACKEND: {app.config['SESSION_BACKEND']} (expected one of {', '.join(SESSION_BACKENDS)})")
+
+def create_session_store(app, host=None, port=None, password=None):
+    """
+    Creates the clients for the configured SESSION_BACKEND.
+
+    :param host: Redis host for the 'redis' backend.
+    :param port: Redis port for the 'redis' backend.
+    :param password: Redis password for the 'redis' backend.
+    :return: A (client, async_clients) tuple. async_clients is None for the in-process stores;
+             async callers then use the synchronous client (see conversation_log._resolve).
+    """
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'memory':
+        return MemoryRedis(max_keys=app.config['SESSION_MEMORY_MAX_KEYS']), None
+    if backend == 'fakeredis':
+        if fakeredis is None:
+            raise ImportError("SESSION_BACKEND=fakeredis requires the fakeredis package")
+        return fakeredis.FakeRedis(decode_responses=False), None
+    if backend == 'local':
+        url = urlparse(app.config['REDIS_URL'])
+        host, port, password = url.hostname or 'localhost', url.port or 6379, url.password
+        ssl = url.scheme == 'rediss'
+        return create_redis_client(app, host, port, password, ssl), AsyncRedisClients(app, host, port, password, ssl)
+    return create_redis_client(app, host, port, password), AsyncRedisClients(app, host, port, password)
@@ -0,0 +1,449 @@
+from flask import current_app
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, want_bytes
+from collections import OrderedDict
+import threading
+import time
+import redis
+import uuid
+from .conversation_log import ConversationLog
+from .session_serializer import SessionSerializer
+
+# Values of these types cannot be changed in place, so reading them never makes a field dirty.
+IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+
+# Hash field holding the session's version stamp, bumped on every write. Never exposed as a session key.
+VERSION_FIELD = '__version__'
+
+# A near-cache hit skips refreshing the session TTLs if this worker refreshed them less than
+# this fraction of the TTL ago, so a cached read costs no round-trip on save either.
+TTL_REFRESH_FRACTION = 0.1
+
+class RedisSession(SessionMixin):
+    """
+    Session mapping over the fields of a stored session hash.
+
+    Stored fields are kept in their serialized form and only decoded when a request first
+    accesses them, so an endpoint that reads one key never parses the prompt text or any
+    other large value. The session also remembers which keys a request wrote or read, so
+    that the session interface can persist only the fields that actually changed.
+    """
+    def __init__(self, initial=None, sid=None, permanent=False, stored=None, serializer=None):
+        self.sid = sid
+        self.serializer = serializer
+        self.stored = stored or {}       # field -> serialized value as it is in Redis
+        self.pending = dict(self.stored) # stored fields not decoded yet
+        self.data = dict(initial or {})  # decoded or newly assigned values
+        self.written = set()             # keys assigned during this request
+        self.read = set()                # keys read during this request (may be mutated in place)
+        self.needs_rewrite = False       # stored in the legacy single-blob format
+        self.version = None              # version stamp the session was loaded at
+        self.ttl_refreshed = False       # TTLs were already refreshed while loading
+        if '_permanent' not in self:
+            self.permanent = permanent
+
+    def __getitem__(self, key):
+        self.read.add(key)
+        if key in self.pending:
+            value = self.serializer.loads(self.pending.pop(key))
+            self.data[key] = value
+            return value
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.written.add(key)
+        self.pending.pop(key, None)
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        if key in self.pending:
+            del self.pending[key]
+        else:
+            del self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data or key in self.pending
+
+    def __iter__(self):
+        return iter(list(self.data) + list(self.pending))
+
+    def __len__(self):
+        return len(self.data) + len(self.pending)
+
+    def clear(self):
+        self.data.clear()
+        self.pending.clear()
+
+class SessionNearCache:
+    """
+    In-process cache of stored session hashes, shared by all requests of a worker.
+
+    An entry younger than `fresh_for` seconds is served without touching Redis. An older
+    entry is revalidated with a single HGET of the session's version stamp and only
+    re-fetched if another worker has written the session since. Writes made by this worker
+    update the entry directly, so the only staleness is a write from another worker within
+    the `fresh_for` window.
+
+    Entries also remember when this worker last refreshed the session's TTLs, so that hits
+    can skip the EXPIREs as well.
+    """
+    def __init__(self, max_entries=1024, fresh_for=0.5):
+        self.max_entries = max_entries
+        self.fresh_for = fresh_for
+        self.entries = OrderedDict()  # key -> (version, fields, stored_at, refreshed_at or None)
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'revalidations': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+    def get(self, key):
+        """
+        :return: A tuple of (version, fields, is_fresh, seconds since the TTLs were refreshed
+                 or None) or None if the key is not cached.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            version, fields, stored_at, refreshed_at = entry
+            now = time.monotonic()
+            refreshed_for = now - refreshed_at if refreshed_at is not None else None
+            return version, dict(fields), now - stored_at <= self.fresh_for, refreshed_for
+
+    def put(self, key, version, fields, refreshed=False):
+        """
+        :param refreshed: Whether the session's TTLs were refreshed along with this read or write.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.entries[key] = (version, dict(fields), now, now if refreshed else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def touch(self, key, refreshed=False):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = (entry[0], entry[1], now, now if refreshed else entry[3])
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, size=len(self.entries), max_entries=self.max_entries, fresh_for=self.fresh_for)
+        lookups = stats['hits'] + stats['revalidations'] + stats['misses'] + stats['invalidations']
+        stats['hit_ratio'] = (stats['hits'] + stats['revalidations']) / lookups if lookups else 0.0
+        return stats
+
+class InstanceAwareRedisSessionInterface(SessionInterface):
+    """
+    Stores every session as a Redis hash with one field per top-level session key.
+
+    Only fields that were assigned, or mutable values that were read and changed in place
+    (e.g. session['user_metrics']['x'] += 1), are serialized and written back on save.
+    Untouched fields such as the full prompt text are never re-serialized or re-uploaded;
+    the TTL is refreshed on every save.
+
+    The conversation itself lives in a separate Redis list (see ConversationLog) that
+    shares the session's TTL.
+
+    Requests that never use the session (static files, the favicon, health probes and
+    CORS preflights) get a null session: nothing is loaded from or saved to Redis and no
+    cookie is set for them.
+
+    Every write bumps a version stamp in the hash, which lets the optional SessionNearCache
+    serve repeated reads of the same session without a network round-trip.
+    """
+    session_class = RedisSession
+
+    def __init__(self, redis, key_prefix, secret_key, use_signer=False, permanent=False, serializer=None,
+                 near_cache=None, async_redis=None, hash_tag=False):
+        self.redis = redis
+        self.async_redis = async_redis
+        self.serializer = serializer or SessionSerializer(codec='json')
+        self.near_cache = near_cache
+        self.key_prefix = key_prefix
+        self.hash_tag = hash_tag
+        self.use_signer = use_signer
+        self.permanent = permanent
+        self.has_same_site_capability = hasattr(self, "get_cookie_samesite")
+        if self.use_signer:
+            self.signer = Signer(secret_key, salt='flask-session',
+                                 key_derivation='hmac')
+
+    def open_session(self, app, request):
+        """
+        This method opens a session for the user by retrieving the session data from Redis.
+        If no session ID (SID) is found in the cookies, it generates a new one.
+        If session data is available in Redis, it loads the session; otherwise, it creates a new session.
+
+        :param app: The Flask application instance.
+        :param request: The Flask request object.
+        :return: The user session.
+        """
+        if self.is_session_exempt(app, request):
+            return self.make_null_session(app)
+
+        sid = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if not sid:
+            sid = self.generate_sid()
+
+        max_retry_attempts = 3
+        retry_attempts = 0
+
+        while retry_attempts < max_retry_attempts:
+            try:
+                session = self.load_session(sid, ttl=int(app.permanent_session_lifetime.total_seconds()))
+                if session is not None:
+                    # Ensure '_id' matches 'sid'
+                    if session.get('_id') != sid:
+                        session['_id'] = sid
+                    return session
+                break  # Exit loop if there is no value
+            except Exception as e:
+                retry_attempts += 1
+                current_app.logger.warning(f"Attempt {retry_attempts}: Failed to load session data for SID: {sid}, Error: {e}")
+                if retry_attempts >= max_retry_attempts:
+                    raise e
+
+        # Create new session
+        session = self.session_class(sid=sid, permanent=self.permanent, serializer=self.serializer)
+        session['_id'] = sid
+        return session
+
+    def is_session_exempt(self, app, request):
+        """
+        Decides from the request alone whether it can skip the session entirely.
+        The URL has not been matched yet when the session is opened, so this works on the path.
+
+        :param app: The Flask application instance.
+        :param request: The Flask request object.
+        :return: True for CORS preflights, static files and SESSION_EXEMPT_PATHS.
+        """
+        if request.method == 'OPTIONS':
+            return True
+        path = request.path
+        static_url_path = app.static_url_path
+        if static_url_path and path.startswith(static_url_path.rstrip('/') + '/'):
+            return True
+        return path in app.config.get('SESSION_EXEMPT_PATHS', ())
+
+    def load_session(self, sid, ttl=None):
+        """
+        Loads the stored hash for a session ID.
+
+        :param sid: The session ID.
+        :param ttl: If given, the session and conversation TTLs are refreshed in the same round-trip.
+        :return: A session populated from Redis, or None if nothing is stored.
+        """
+        key = self.session_key(sid)
+        touch = [key, self.conversation_key(sid)] if ttl else []
+        try:
+            stored, version, touched = self.fetch_fields(key, ttl, touch)
+        except redis.exceptions.ResponseError:
+            # WRONGTYPE: written as a single JSON blob before sessions were stored as hashes
+            val = self.redis.get(key)
+            if val is None:
+                return None
+            session = self.session_class(initial=self.serializer.loads(val), sid=sid, serializer=self.serializer)
+            session.needs_rewrite = True
+            return session
+
+        if not stored:
+            return None
+        # Values are decoded lazily by the session on first access
+        session = self.session_class(sid=sid, stored=stored, serializer=self.serializer)
+        session.version = version
+        session.ttl_refreshed = touched
+        return session
+
+    def fetch_fields(self, key, ttl=None, touch=()):
+        """
+        Reads a session hash, going through the near-cache when it is enabled.
+        Reads that do reach Redis are pipelined with an EXPIRE of every key in `touch`.
+
+        :param key: The Redis key of the session.
+        :param ttl: The TTL to refresh the touched keys to.
+        :param touch: Keys whose TTL to refresh.
+        :return: A tuple of (field -> serialized value, version stamp or None, whether the TTLs were refreshed).
+        """
+        cache = self.near_cache
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                version, fields, is_fresh, refreshed_for = cached
+                if is_fresh:
+                    # No Redis command at all; the TTLs count as refreshed if this worker did so recently
+                    cache.count('hits')
+                    recently = refreshed_for is not None and ttl and refreshed_for <= ttl * TTL_REFRESH_FRACTION
+                    return fields, version, bool(touch and recently)
+                current = self.pipelined(lambda pipe: pipe.hget(key, VERSION_FIELD), ttl, touch)
+                if current is not None and int(current) == version:
+                    cache.touch(key, refreshed=bool(touch))
+                    cache.count('revalidations')
+                    return fields, version, bool(touch)
+                cache.discard(key)
+                cache.count('invalidations')
+            else:
+                cache.count('misses')
+
+        stored = self.pipelined(lambda pipe: pipe.hgetall(key), ttl, touch)
+        stored = {field.decode('utf-8') if isinstance(field, bytes) else field: value
+                  for field, value in stored.items()}
+        version = stored.pop(VERSION_FIELD, None)
+        version = int(version) if version is not None else None
+        if cache is not None and stored and version is not None:
+            cache.put(key, version, stored, refreshed=bool(touch))
+        return stored, version, bool(touch)
+
+    def pipelined(self, command, ttl=None, touch=()):
+        """
+        Runs a single read command together with EXPIREs of the touched keys in one round-trip.
+
+        :param command: Callable queuing the read on the pipeline it is given.
+        :return: The result of the read command.
+        """
+        if not touch:
+            return command(self.redis)
+        pipe = self.redis.pipeline(transaction=False)
+        command(pipe)
+        for touched_key in touch:
+            pipe.expire(touched_key, ttl)
+        return pipe.execute()[0]
+
+    def dirty_fields(self, session):
+        """
+        Works out which fields have to be written back for a session.
+
+        :param session: The session being saved.
+        :return: A tuple of (changed fields as field -> serialized value, removed field names).
+        """
+        candidates = set(session.written)
+        for key in session.read:
+            if key in session.data and not isinstance(session.data[key], IMMUTABLE_TYPES):
+                candidates.add(key)
+        if session.needs_rewrite:
+            candidates = set(session.data)
+
+        changed = {}
+        for key in candidates:
+            if key not in session.data:
+                continue
+            value = self.serializer.dumps(session.data[key])
+            if session.needs_rewrite or session.stored.get(key) != value:
+                changed[key] = value
+        if session.needs_rewrite:
+            # Fields that were never decoded go back exactly as they were stored
+            changed.update(session.pending)
+
+        removed = [key for key in session.stored if key not in session]
+        return changed, removed
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        key = self.session_key(session.sid)
+        if not session:
+            if session.modified:
+                self.redis.delete(key, self.conversation_key(session.sid))
+                if self.near_cache is not None:
+                    self.near_cache.discard(key)
+                response.delete_cookie(app.config['SESSION_COOKIE_NAME'],
+                                       domain=domain, path=path)
+            return
+
+        httponly = self.get_cookie_httponly(app)
+        secure = self.get_cookie_secure(app)
+        expires = self.get_expiration_time(app, session)
+
+        if session.get('_id') != session.sid:
+            session['_id'] = session.sid
+        changed, removed = self.dirty_fields(session)
+        max_age = int(app.permanent_session_lifetime.total_seconds())
+        rewrite = session.needs_rewrite
+
+        new_version = None
+        if changed or removed or rewrite or not session.ttl_refreshed:
+            # Everything goes out in one round-trip; read-only requests whose TTL was already
+            # refreshed while loading, or recently by this worker (near-cache hits), skip Redis entirely
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.expire(key, max_age)
+            pipe.expire(self.conversation_key(session.sid), max_age)
+            if changed or removed or rewrite:
+                if rewrite:
+                    pipe.delete(key)
+                elif removed:
+                    pipe.hdel(key, *removed)
+                if changed:
+                    pipe.hset(key, mapping=changed)
+                pipe.hincrby(key, VERSION_FIELD, 1)
+                pipe.expire(key, max_age)
+            results = pipe.execute()
+            refreshed = results[0]
+            if changed or removed or rewrite:
+                new_version = results[-2]
+
+            if not refreshed and session.stored and not rewrite:
+                # The hash expired between load and save; write the whole session back
+                session.needs_rewrite = rewrite = True
+                changed, removed = self.dirty_fields(session)
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.hset(key, mapping=changed)
+                pipe.hincrby(key, VERSION_FIELD, 1)
+                pipe.expire(key, max_age)
+                new_version = pipe.execute()[-2]
+
+        if self.near_cache is not None and new_version is not None:
+            # Only cache what this worker wrote if nobody else wrote in between
+            if rewrite or new_version == (session.version or 0) + 1:
+                fields = {} if rewrite else dict(session.stored)
+                fields.update(changed)
+                for field in removed:
+                    fields.pop(field, None)
+                self.near_cache.put(key, new_version, fields, refreshed=True)
+            else:
+                self.near_cache.discard(key)
+
+        if self.use_signer:
+            session_id = self.signer.sign(want_bytes(session.sid))
+        else:
+            session_id = session.sid
+
+        response.set_cookie(app.config['SESSION_COOKIE_NAME'], session_id,
+                            expires=expires, httponly=httponly,
+                            domain=domain, path=path, secure=secure)
+
+    def session_key(self, sid):
+        """
+        Builds the Redis key of a session. With hash_tag set the sid is wrapped in {...}, so on
+        a Redis Cluster sessions are sharded by sid while a session and its conversation log
+        always land in the same slot.
+        """
+        if self.hash_tag:
+            return f"{self.key_prefix}{{{sid}}}"
+        return self.key_prefix + sid
+
+    def conversation_key(self, sid):
+        return f"{self.session_key(sid)}:conversation"
+
+    def conversation_log(self, app, sid):
+        """
+        Returns the conversation log stored alongside a session.
+
+        :param app: The Flask application instance.
+        :param sid: The session ID.
+        :return: A ConversationLog with the same TTL as the session.
+        """
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        return ConversationLog(self.redis, self.conversation_key(sid), ttl, serializer=self.serializer)
+
+    def generate_sid(self):
+        return str(uuid.uuid4())
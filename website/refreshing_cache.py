@@ -0,0 +1,147 @@
+import threading
+import time
+
+class RefreshingCache:
+    """
+    Per-process read-through cache with a TTL, stale-while-revalidate and single-flight loading.
+
+    A value younger than `ttl` is returned as is. An older one is still returned for up to
+    `stale_ttl` more seconds while a background thread reloads it, so callers never wait for a
+    refresh. Only a missing or fully expired key is loaded inline, and concurrent callers for
+    the same key share that one load instead of each calling the loader.
+
+    If a load fails (raises or returns None), the previous value is kept and served, so an
+    outage of the source degrades to slightly old data rather than errors. seed() puts in a
+    warm-start value that is served right away and replaced by the first successful load.
+
+    With `refresh_ahead`, a value is already reloaded in the background once it is that
+    fraction of its TTL old, so a busy key is replaced before it ever turns stale.
+    """
+    def __init__(self, loader, ttl=600, stale_ttl=86400, app=None, name='cache', ttl_for=None, refresh_ahead=None):
+        """
+        :param loader: Callable taking the key and returning its value, or None if unavailable.
+        :param ttl: Seconds a loaded value is fresh.
+        :param stale_ttl: Further seconds a value is served while it is refreshed.
+        :param app: Flask app whose context background refreshes run in, if the loader needs one.
+        :param name: Used in log messages.
+        :param ttl_for: Optional callable taking a key and returning its TTL, or None for `ttl`.
+        :param refresh_ahead: Optional fraction of the TTL after which a fresh value is reloaded.
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.ttl_for = ttl_for
+        self.refresh_ahead = refresh_ahead
+        self.app = app
+        self.name = name
+        self.entries = {}   # key -> (value, loaded_at); loaded_at is None for seeded values
+        self.loading = {}   # key -> threading.Event set when the in-flight load finishes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.load_errors = 0
+
+    def get(self, key, wait=True):
+        """
+        :param wait: If False, never block: a missing key is loaded in the background and None is returned.
+        :return: The cached value for key, loading it if needed, or None if it cannot be loaded.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                age = time.monotonic() - loaded_at if loaded_at is not None else None
+                ttl = self._ttl(key)
+                if age is not None and age < ttl:
+                    self.hits += 1
+                    if self.refresh_ahead is not None and age >= ttl * self.refresh_ahead:
+                        self._start_refresh(key)
+                    return value
+                if age is None or age < ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._start_refresh(key)
+                    return value
+            self.misses += 1
+            if not wait:
+                self._start_refresh(key)
+                return None
+            event = self.loading.get(key)
+            owner = event is None
+            if owner:
+                event = self.loading[key] = threading.Event()
+
+        if owner:
+            self._load(key, event)
+        else:
+            event.wait()
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def refresh(self, key):
+        """
+        Reloads key in the background, e.g. to warm the cache at startup.
+        """
+        with self.lock:
+            self._start_refresh(key)
+
+    def seed(self, key, value):
+        """
+        Stores a warm-start value, unless a loaded one is already cached.
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (value, None)
+
+    def invalidate(self, key=None):
+        """
+        Drops one key, or every key when none is given, so the next get() loads it again.
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'name': self.name,
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'load_errors': self.load_errors,
+            }
+
+    def _ttl(self, key):
+        ttl = self.ttl_for(key) if self.ttl_for is not None else None
+        return self.ttl if ttl is None else ttl
+
+    def _start_refresh(self, key):
+        # Called with self.lock held; at most one refresh per key is in flight
+        if key in self.loading:
+            return
+        event = self.loading[key] = threading.Event()
+        threading.Thread(target=self._load, args=(key, event), name=f'{self.name}-refresh', daemon=True).start()
+
+    def _load(self, key, event):
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    value = self.loader(key)
+            else:
+                value = self.loader(key)
+        except Exception as e:
+            value = None
+            if self.app is not None:
+                self.app.logger.error(f"Error loading {key!r} into {self.name}: {str(e)}")
+
+        with self.lock:
+            if value is not None:
+                self.entries[key] = (value, time.monotonic())
+            else:
+                self.load_errors += 1
+            del self.loading[key]
+        event.set()
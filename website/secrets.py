@@ -1,7 +1,10 @@
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, current_app, has_app_context
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 from flask_login import login_required
+import logging
+import os
+from .refreshing_cache import RefreshingCache
 
 
 # Create the blueprint
@@ -16,18 +19,71 @@ credential = DefaultAzureCredential()
 # Create a secret client
 secret_client = SecretClient(vault_url=key_vault_url, credential=credential)
 
-def get_secret(secret_name):
+# Set SECRETS_SOURCE=env to run without Key Vault access (local runs, benchmarks). Secrets
+# are then read from environment variables named like the secret with '_' for '-'
+# (e.g. WIX_API_KEY); with Key Vault, environment variables are never consulted.
+secrets_source = os.environ.get('SECRETS_SOURCE', 'keyvault').lower()
+
+# Secrets are cached in-process: a rotated secret is picked up within its TTL, and values
+# are refreshed in the background before that, so callers do not wait on Key Vault.
+SECRET_CACHE_TTL = float(os.environ.get('SECRET_CACHE_TTL', 300))
+# How long a cached value is still served while Key Vault cannot be reached
+SECRET_CACHE_STALE_TTL = float(os.environ.get('SECRET_CACHE_STALE_TTL', 86400))
+
+def _parse_ttls(value):
+    # SECRET_CACHE_TTLS="WIX-API-KEY=3600,SPEECH-LOCATION=3600" overrides the TTL of single secrets
+    ttls = {}
+    for entry in (value or '').split(','):
+        name, _, ttl = entry.partition('=')
+        if name.strip() and ttl.strip():
+            ttls[name.strip()] = float(ttl)
+    return ttls
+
+SECRET_TTLS = _parse_ttls(os.environ.get('SECRET_CACHE_TTLS'))
+
+def _logger():
+    # Also used from create_app and from refresh threads, where there is no app context
+    return current_app.logger if has_app_context() else logging.getLogger(__name__)
+
+def _fetch_secret(secret_name):
     try:
         return secret_client.get_secret(secret_name).value
     except Exception as e:
-        current_app.logger.error(f"Error retrieving secret {secret_name}: {e}")
+        _logger().error(f"Error retrieving secret {secret_name}: {e}")
         return None
 
+secret_cache = RefreshingCache(_fetch_secret, ttl=SECRET_CACHE_TTL, stale_ttl=SECRET_CACHE_STALE_TTL,
+                               name='secret-cache', ttl_for=SECRET_TTLS.get, refresh_ahead=0.8)
+
+def get_secret(secret_name):
+    if secrets_source == 'env':
+        return os.environ.get(secret_name.replace('-', '_'))
+    return secret_cache.get(secret_name)
+
+def invalidate_secret(secret_name=None):
+    """
+    Drops a cached secret, or all of them, e.g. right after rotating it in Key Vault.
+    """
+    secret_cache.invalidate(secret_name)
+
 # Add the routes to the blueprint
+@secrets.route('/speech-token')
+@login_required
+def get_speech_token():
+    # Short-lived token for the browser's Speech SDK; the subscription key stays on the server
+    from .speech_token import speech_token_broker
+    token = speech_token_broker.get_token()
+    if token is None:
+        return jsonify({'error': 'Speech token not available'}), 503
+    response = jsonify(token)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @secrets.route('/<secret_name>')
 @login_required
 def get_azure_secret(secret_name):
-    allowed_secrets = {'KEY1-SPEECH', 'SPEECH-LOCATION'}
+    # The Speech key is no longer handed out, browsers get a token from /secrets/speech-token
+    allowed_secrets = {'SPEECH-LOCATION'}
     
     if secret_name not in allowed_secrets:
         return jsonify({'error': 'Invalid secret name'}), 403
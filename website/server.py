@@ -1,9 +1,29 @@
-from flask import Blueprint, jsonify, session, current_app, Response
+from flask import Blueprint, jsonify, session, current_app, Response, request
 from flask_login import current_user
 from flask_cors import cross_origin
+from functools import wraps
+import hmac
+from .secrets import get_secret, secret_cache, invalidate_secret
 
 server = Blueprint('server', __name__)
 
+def admin_required(view):
+    """
+    Restricts an operational endpoint (stats, reports, invalidation) to callers sending the
+    shared admin token (Key Vault secret ADMIN-TOKEN) in the X-Admin-Token header. Without a configured token the endpoint
+    is disabled. Browsers cannot send the custom header cross-site without a CORS preflight,
+    which the app does not allow for it, so this also guards against CSRF.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        admin_token = get_secret('ADMIN-TOKEN')
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not admin_token or not hmac.compare_digest(supplied.encode('utf-8'), admin_token.encode('utf-8')):
+            current_app.logger.warning(f"Rejected unauthorized call to {request.path}")
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
 @server.route('/test-redis')
 def test_redis():
     try:
@@ -16,6 +36,89 @@ def test_redis():
     except Exception as e:
         return f"Redis test failed: {str(e)}"
 
+@server.route('/session-cache-stats')
+@admin_required
+def session_cache_stats():
+    near_cache = getattr(current_app.session_interface, 'near_cache', None)
+    if near_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(near_cache.stats(), enabled=True))
+
+@server.route('/prompt-cache', methods=['GET'])
+@admin_required
+def prompt_cache_stats():
+    wix_db = current_app.extensions.get('wix_db')
+    if wix_db is None or wix_db.prompt_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(wix_db.prompt_cache.stats(), enabled=True))
+
+@server.route('/prompt-cache/invalidate', methods=['POST'])
+@admin_required
+def invalidate_prompt_cache():
+    # Call after editing a prompt in Wix; without a title every cached prompt is dropped
+    interview_title = request.args.get('interviewTitle')
+    wix_db = current_app.extensions.get('wix_db')
+    if wix_db is None:
+        return jsonify({"error": "WixDatabase not initialized"}), 500
+    wix_db.invalidate_prompt(interview_title)
+    return jsonify({"invalidated": interview_title or "all"})
+
+@server.route('/startup', methods=['GET'])
+@admin_required
+def startup_report():
+    timer = current_app.extensions.get('startup')
+    if timer is None:
+        return jsonify({"error": "No startup report"}), 404
+    return jsonify(timer.report())
+
+@server.route('/secret-cache', methods=['GET'])
+@admin_required
+def secret_cache_stats():
+    return jsonify(secret_cache.stats())
+
+@server.route('/secret-cache/invalidate', methods=['POST'])
+@admin_required
+def invalidate_secret_cache():
+    # Call after rotating a secret in Key Vault; without a name every cached secret is dropped
+    secret_name = request.args.get('name')
+    invalidate_secret(secret_name)
+    return jsonify({"invalidated": secret_name or "all"})
+
+@server.route('/cv-cache', methods=['GET'])
+@admin_required
+def cv_cache_stats():
+    cv_cache = current_app.extensions.get('cv_cache')
+    if cv_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(cv_cache.stats(), enabled=True))
+
+@server.route('/avatar-selector/reload', methods=['POST'])
+@admin_required
+def reload_avatar_selector():
+    # Call after editing the avatar selector in Wix
+    wix_db = current_app.extensions.get('wix_db')
+    if wix_db is None or wix_db.avatar_index is None:
+        return jsonify({"error": "WixDatabase not initialized"}), 500
+    wix_db.avatar_index.reload()
+    return jsonify({"reloading": True})
+
+@server.route('/wix-stats', methods=['GET'])
+@admin_required
+def wix_stats():
+    wix_db = current_app.extensions.get('wix_db')
+    if wix_db is None:
+        return jsonify({"error": "WixDatabase not initialized"}), 500
+    return jsonify(wix_db.wix_stats())
+
+@server.route('/wix-stats/reset', methods=['POST'])
+@admin_required
+def reset_wix_stats():
+    wix_db = current_app.extensions.get('wix_db')
+    if wix_db is None:
+        return jsonify({"error": "WixDatabase not initialized"}), 500
+    wix_db.stats.reset()
+    return jsonify({"reset": True})
+
 @server.route('/test-cors', methods=['GET', 'POST'])
 @cross_origin(supports_credentials=True)
 def test_cors():
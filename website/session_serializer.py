@@ -0,0 +1,144 @@
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Every value written by SessionSerializer starts with this header:
+#   MAGIC (3 bytes) | envelope version (1 byte) | codec id (1 byte) | compression id (1 byte)
+# JSON text never starts with a NUL byte, so values without the header are legacy JSON.
+ENVELOPE_MAGIC = b"\x00MS"
+ENVELOPE_VERSION = 1
+HEADER_SIZE = len(ENVELOPE_MAGIC) + 3
+
+CODEC_IDS = {'json': 0, 'msgpack': 1, 'msgspec': 2}
+COMPRESSION_IDS = {None: 0, 'zlib': 1, 'zstd': 2}
+
+class SessionSerializer:
+    """
+    Encodes session values with a configurable codec and optional compression,
+    wrapped in a small versioned envelope.
+
+    Decoding looks only at the envelope, so values written with any codec or compression
+    (and plain JSON from before the envelope existed) can always be read back, whatever
+    the current configuration is. That makes changing SESSION_SERIALIZER a transparent rollout.
+    """
+    def __init__(self, codec='msgpack', compression=None, compression_threshold=1024, compression_level=None):
+        if codec not in CODEC_IDS:
+            raise ValueError(f"Unknown session codec: {codec}")
+        if compression not in COMPRESSION_IDS:
+            raise ValueError(f"Unknown session compression: {compression}")
+        if codec == 'msgpack' and msgpack is None:
+            raise ImportError("msgpack is not installed")
+        if codec == 'msgspec' and msgspec is None:
+            raise ImportError("msgspec is not installed")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstandard is not installed")
+
+        self.codec = codec
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+        self._header = ENVELOPE_MAGIC + bytes([ENVELOPE_VERSION, CODEC_IDS[codec]])
+
+        if msgspec is not None:
+            self._msgspec_encoder = msgspec.msgpack.Encoder()
+            self._msgspec_decoder = msgspec.msgpack.Decoder()
+        if zstandard is not None:
+            self._zstd_compressor = zstandard.ZstdCompressor(level=compression_level or 3)
+            self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+    def dumps(self, value):
+        """
+        Serializes a value into an enveloped byte string.
+
+        :param value: Any JSON-compatible value.
+        :return: The encoded bytes.
+        """
+        body = self._encode(value)
+        compression = None
+        if self.compression and len(body) >= self.compression_threshold:
+            compressed = self._compress(body)
+            if len(compressed) < len(body):
+                body = compressed
+                compression = self.compression
+        return self._header + bytes([COMPRESSION_IDS[compression]]) + body
+
+    def loads(self, data):
+        """
+        Deserializes a value written by dumps() or by the legacy JSON serializer.
+
+        :param data: The stored bytes (or str for legacy values).
+        :return: The decoded value.
+        """
+        if isinstance(data, str):
+            return json.loads(data)
+        if not data.startswith(ENVELOPE_MAGIC):
+            return json.loads(data)
+
+        version, codec_id, compression_id = data[len(ENVELOPE_MAGIC):HEADER_SIZE]
+        if version != ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported session envelope version: {version}")
+        body = data[HEADER_SIZE:]
+        if compression_id == COMPRESSION_IDS['zlib']:
+            body = zlib.decompress(body)
+        elif compression_id == COMPRESSION_IDS['zstd']:
+            if zstandard is None:
+                raise ImportError("zstandard is required to read zstd-compressed session values")
+            body = self._zstd_decompressor.decompress(body)
+
+        if codec_id == CODEC_IDS['json']:
+            return json.loads(body)
+        if codec_id == CODEC_IDS['msgspec'] and msgspec is not None:
+            return self._msgspec_decoder.decode(body)
+        # msgspec writes standard msgpack, so either library can read either codec
+        if msgpack is not None:
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        return self._msgspec_decoder.decode(body)
+
+    def _encode(self, value):
+        if self.codec == 'msgpack':
+            return msgpack.packb(value, use_bin_type=True)
+        if self.codec == 'msgspec':
+            return self._msgspec_encoder.encode(value)
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def _compress(self, body):
+        if self.compression == 'zstd':
+            return self._zstd_compressor.compress(body)
+        return zlib.compress(body, self.compression_level if self.compression_level is not None else 6)
+
+def create_session_serializer(app):
+    """
+    Builds the session serializer from the app config.
+
+    SESSION_SERIALIZER selects the codec ('json', 'msgpack' or 'msgspec'),
+    SESSION_COMPRESSION selects None, 'zlib' or 'zstd' and SESSION_COMPRESSION_THRESHOLD
+    is the encoded size in bytes from which values are compressed.
+    """
+    codec = app.config.get('SESSION_SERIALIZER', 'msgpack')
+    compression = app.config.get('SESSION_COMPRESSION', 'zlib')
+    threshold = app.config.get('SESSION_COMPRESSION_THRESHOLD', 1024)
+    if compression in ('', 'none', 'None'):
+        compression = None
+
+    if compression == 'zstd' and zstandard is None:
+        app.logger.warning("zstandard is not installed, falling back to zlib session compression")
+        compression = 'zlib'
+    if codec == 'msgspec' and msgspec is None or codec == 'msgpack' and msgpack is None:
+        app.logger.warning(f"{codec} is not installed, falling back to JSON session serialization")
+        codec = 'json'
+
+    return SessionSerializer(codec=codec, compression=compression, compression_threshold=threshold)
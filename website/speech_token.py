@@ -0,0 +1,67 @@
+import logging
+import os
+import time
+from flask import current_app, has_app_context
+from .secrets import get_secret
+from .http_client import get_http_session
+from .refreshing_cache import RefreshingCache
+
+# Azure Speech authorization tokens are valid for 10 minutes
+SPEECH_TOKEN_LIFETIME = 600
+# Tokens are handed out for at most this long after they were issued, then replaced
+SPEECH_TOKEN_TTL = float(os.environ.get('SPEECH_TOKEN_TTL', 540))
+
+ISSUE_TOKEN_URL = "https://{region}.api.cognitive.microsoft.com/sts/v1.0/issueToken"
+
+class SpeechTokenBroker:
+    """
+    Exchanges the Speech subscription key for short-lived authorization tokens, so the key
+    never leaves the server.
+
+    One token per region is cached and shared by every page load until SPEECH_TOKEN_TTL
+    after it was issued; it is renewed in the background before then, so callers rarely
+    wait for the token endpoint. An expired token is never served.
+    """
+    def __init__(self, ttl=SPEECH_TOKEN_TTL):
+        self.cache = RefreshingCache(self._issue_token, ttl=ttl, stale_ttl=0, name='speech-token', refresh_ahead=0.8)
+
+    def get_token(self, region=None):
+        """
+        :param region: The Speech region, SPEECH-LOCATION by default.
+        :return: A dict with 'token', 'region' and 'expires_in' (seconds the token is still
+                 valid), or None if no token could be issued.
+        """
+        region = region or get_secret('SPEECH-LOCATION')
+        if not region:
+            current_app.logger.error("No Speech region configured (SPEECH-LOCATION).")
+            return None
+        issued = self.cache.get(region)
+        if issued is None:
+            return None
+        token, issued_at = issued
+        return {
+            'token': token,
+            'region': region,
+            'expires_in': max(0, int(issued_at + SPEECH_TOKEN_LIFETIME - time.time())),
+        }
+
+    def _issue_token(self, region):
+        # Also runs in refresh threads, where there is no app context
+        logger = current_app.logger if has_app_context() else logging.getLogger(__name__)
+        speech_key = get_secret('KEY1-SPEECH')
+        if not speech_key:
+            logger.error("Azure Speech key (KEY1-SPEECH) not found")
+            return None
+        issued_at = time.time()
+        try:
+            response = get_http_session().post(
+                ISSUE_TOKEN_URL.format(region=region),
+                headers={'Ocp-Apim-Subscription-Key': speech_key, 'Content-Length': '0'}
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"Error issuing a Speech token for {region}: {e}")
+            return None
+        return response.text, issued_at
+
+speech_token_broker = SpeechTokenBroker()
@@ -0,0 +1,74 @@
+import time
+
+# Taken when the package starts importing (this module is imported first by website/__init__.py)
+IMPORT_STARTED = time.perf_counter()
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .secrets import get_secret
+
+# Secrets create_app cannot do without, fetched concurrently before anything else
+STARTUP_SECRETS = ('WIX-API-KEY', 'WIX-SITE-ID', 'FLASK-SECRET-KEY')
+# Only needed with SESSION_BACKEND=redis
+REDIS_SECRETS = ('KEY1-REDIS',)
+# Secrets of the AI, search and speech clients, which are built on first use. They are fetched
+# in the background after startup, so the first interview does not wait for Key Vault either.
+WARM_SECRETS = ('KEY1-AI-US', 'AI-ENDPOINT-US', 'STEWARD-SEARCH-API-KEY', 'INTERVIEWER-US',
+                'ASSISTANT-US', 'ANALYZER-US', 'KEY1-SPEECH', 'SPEECH-LOCATION')
+
+SECRET_PREFETCH_WORKERS = int(os.environ.get('SECRET_PREFETCH_WORKERS', 8))
+
+def prefetch_secrets(secret_names, max_workers=SECRET_PREFETCH_WORKERS):
+    """
+    Fetches secrets concurrently into the secret cache, so later get_secret calls are served from memory.
+
+    :return: A dict of secret name to value (None for any that could not be fetched).
+    """
+    secret_names = list(dict.fromkeys(secret_names))
+    if not secret_names:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(secret_names)), thread_name_prefix='secret-prefetch') as executor:
+        return dict(zip(secret_names, executor.map(get_secret, secret_names)))
+
+def prefetch_secrets_in_background(secret_names):
+    thread = threading.Thread(target=prefetch_secrets, args=(secret_names,), name='secret-warmup', daemon=True)
+    thread.start()
+    return thread
+
+class StartupTimer:
+    """
+    Records how long each phase of create_app takes, for the startup report.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = [('imports', self.started - IMPORT_STARTED)]
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def total(self):
+        return time.perf_counter() - IMPORT_STARTED
+
+    def report(self):
+        """
+        :return: A dict with the seconds spent per phase and in total, in the order they ran.
+        """
+        return {
+            'phases': [{'name': name, 'seconds': round(seconds, 3)} for name, seconds in self.phases],
+            'total_seconds': round(self.total(), 3),
+        }
+
+    def format_report(self):
+        total = self.total()
+        lines = [f"Startup took {total:.3f}s:"]
+        for name, seconds in self.phases:
+            share = seconds / total * 100 if total else 0
+            lines.append(f"  {name:<16} {seconds:8.3f}s {share:5.1f}%")
+        return '\n'.join(lines)
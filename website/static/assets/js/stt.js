@@ -4,6 +4,8 @@ import { voiceIcon, microphoneIcon } from "./icons.js";
 import { elements } from "./actions.js";
 
 const MAX_RETRIES = 3;
+// Delay before retrying a failed token refresh, in milliseconds
+const TOKEN_RETRY_DELAY = 15000;
 
 class SpeechToTextService {
   constructor() {
@@ -12,6 +14,7 @@ class SpeechToTextService {
     this.speechConfig = null;
     this.audioConfig = null;
     this.recognizer = null;
+    this.tokenRefreshTimeout = null;
 
     // Create a logger for the speech service
     this.logger = createLogger({
@@ -91,10 +94,10 @@ class SpeechToTextService {
         return false;
       }
 
-      const region = await this._fetchSecret("SPEECH-LOCATION");
-      const apiKey = await this._fetchSecret("KEY1-SPEECH");
-      this.speechConfig = this.sdk.SpeechConfig.fromSubscription(
-        apiKey,
+      // Short-lived token from the server; the subscription key never reaches the browser
+      const { token, region, expires_in } = await this._fetchSpeechToken();
+      this.speechConfig = this.sdk.SpeechConfig.fromAuthorizationToken(
+        token,
         region,
       );
       this.speechConfig.speechRecognitionLanguage = "en-US";
@@ -113,6 +116,7 @@ class SpeechToTextService {
       );
 
       this.setupRecognitionHandlers();
+      this.scheduleTokenRefresh(expires_in);
       await this.startRecognizerSession();
 
       this.isInitialized = true;
@@ -478,46 +482,87 @@ class SpeechToTextService {
     }
   }
 
-  /**
-   * Fetch a secret from the server.
-   * @param {string} key - Key for the secret.
-   * @returns {Promise<string>} - The secret value.
-   * @throws {Error} - Throws an error if all retry attempts fail or if too many retries have been made.
-   */
-  async _fetchSecret(key) {
-    if (!key || typeof key !== "string") {
-      throw new Error("Invalid key parameter");
+  // Tokens expire after 10 minutes; give the recognizer a new one a minute before that.
+  // A failed refresh is retried while the current token is still valid.
+  scheduleTokenRefresh(expiresIn) {
+    clearTimeout(this.tokenRefreshTimeout);
+    const refreshIn = Math.max((expiresIn - 60) * 1000, 10000);
+    const expiresAt = Date.now() + expiresIn * 1000;
+    this.tokenRefreshTimeout = setTimeout(
+      () => this._refreshSpeechToken(expiresAt),
+      refreshIn,
+    );
+  }
+
+  async _refreshSpeechToken(expiresAt) {
+    if (!this.recognizer) return;
+    try {
+      const { token, expires_in } = await this._fetchSpeechToken({
+        redirectOnFailure: false,
+      });
+      if (!this.recognizer) return;
+      this.recognizer.authorizationToken = token;
+      this.scheduleTokenRefresh(expires_in);
+    } catch (error) {
+      console.error("Failed to refresh the speech token:", error);
+      if (!this.recognizer) return;
+      if (Date.now() + TOKEN_RETRY_DELAY < expiresAt) {
+        this.tokenRefreshTimeout = setTimeout(
+          () => this._refreshSpeechToken(expiresAt),
+          TOKEN_RETRY_DELAY,
+        );
+      }
     }
+  }
 
+  /**
+   * Fetch a Speech authorization token for the recognizer from the server.
+   * @param {Object} [options]
+   * @param {boolean} [options.redirectOnFailure=true] - Alert and leave the interview when no
+   *   token can be fetched. Background refreshes pass false to handle the error themselves.
+   * @returns {Promise<{token: string, region: string, expires_in: number}>} - The token, its
+   *   region and the seconds it is still valid.
+   * @throws {Error} - Throws an error if all retry attempts fail or if the server answers 429.
+   */
+  async _fetchSpeechToken({ redirectOnFailure = true } = {}) {
     let attempt = 0;
 
     while (attempt < MAX_RETRIES) {
+      let response;
       try {
-        const response = await fetch(`/secrets/${encodeURIComponent(key)}`, {
+        response = await fetch("/secrets/speech-token", {
           method: "GET",
           headers: {
             "Content-Type": "application/json",
           },
           credentials: "same-origin",
         });
+      } catch (error) {
+        console.error(`Attempt ${attempt + 1} failed: ${error.message}`);
+        attempt++;
+        continue;
+      }
+
+      if (response.status === 429) {
+        // HTTP status code for too many requests
+        if (redirectOnFailure) {
+          alert("You have retried too many times. Please try again later.");
+          window.location.href = "https://www.mindorah.com/myinterviews";
+        }
+        throw new Error("Too many retry attempts.");
+      }
 
+      try {
         if (!response.ok) {
-          if (response.status === 429) {
-            // HTTP status code for too many requests
-            alert("You have retried too many times. Please try again later.");
-            window.location.href = "https://www.mindorah.com/myinterviews";
-            throw new Error("Too many retry attempts.");
-          } else {
-            throw new Error(`HTTP error! status: ${response.status}`);
-          }
+          throw new Error(`HTTP error! status: ${response.status}`);
         }
 
         const data = await response.json();
-        if (!data || !data.value) {
+        if (!data || !data.token || !data.region) {
           throw new Error("Invalid response format");
         }
 
-        return data.value;
+        return data;
       } catch (error) {
         console.error(`Attempt ${attempt + 1} failed: ${error.message}`);
         attempt++;
@@ -525,10 +570,12 @@ class SpeechToTextService {
     }
 
     // If all attempts fail
-    alert(
-      "Failed to fetch the secret after multiple attempts. Please try again later.",
-    );
-    window.location.href = "https://www.mindorah.com/myinterviews";
+    if (redirectOnFailure) {
+      alert(
+        "Failed to fetch the speech token after multiple attempts. Please try again later.",
+      );
+      window.location.href = "https://www.mindorah.com/myinterviews";
+    }
     throw new Error("Exceeded maximum retry attempts");
   }
 
@@ -619,6 +666,8 @@ class SpeechToTextService {
       this.isInitialized = false;
       this.isListening = false;
       this.cleanupTimers();
+      clearTimeout(this.tokenRefreshTimeout);
+      this.tokenRefreshTimeout = null;
       this.recognizer = null;
       this.audioConfig = null;
       this.speechConfig = null;
@@ -0,0 +1,85 @@
+import random
+from flask import current_app
+from .circuit_breaker import CircuitBreaker
+from .wix_stats import is_idempotent
+
+def not_applied(error):
+    """
+    :param error: The error of a failed request, see WixDatabase._request.
+    :return: True if the request certainly changed nothing in Wix: the circuit breaker refused
+             it, no connection could be made, or Wix answered with a 4xx status. After a
+             timeout, a dropped connection, a 5xx or an unreadable 2xx it may have been applied.
+    """
+    return error in ('circuit_open', 'connect') or (isinstance(error, int) and 400 <= error < 500)
+
+class WixCallPolicy:
+    """
+    The retry, circuit breaker and statistics bookkeeping of calls to the Wix Data API,
+    shared by WixDatabase and AsyncWixDatabase, which only do the HTTP I/O themselves.
+
+    Queries and GETs change nothing, so they are retried with full-jitter backoff after a
+    timeout, a connection error, a 429 or a 5xx response; writes are sent once. Only those
+    failures count towards opening the circuit breaker: any other 4xx means Wix is up and
+    the request itself was wrong (e.g. 404 for a missing item).
+
+    A caller loops over delays(), sleeping for each one, and per attempt checks allow(),
+    sends the request and hands its outcome to finish().
+    """
+    def __init__(self, stats, breaker=None, attempts=3, backoff=0.2, backoff_cap=2.0):
+        """
+        :param stats: The WixStats every attempt is recorded in.
+        :param attempts: Attempts made of a request that is safe to retry.
+        :param backoff: Base delay in seconds, doubled per retry up to `backoff_cap`.
+        """
+        self.stats = stats
+        self.breaker = breaker or CircuitBreaker(name='wix')
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+
+    def delays(self, method, endpoint):
+        """
+        :return: An iterator of the seconds to wait before each attempt, 0 before the first.
+        """
+        attempts = self.attempts if is_idempotent(method, endpoint) else 1
+        for attempt in range(attempts):
+            if attempt:
+                self.stats.record_retry()
+                yield random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** attempt))
+            else:
+                yield 0
+
+    def allow(self, label):
+        """
+        :return: False if the circuit breaker refuses the attempt, which the caller then gives up.
+        """
+        if self.breaker.allow():
+            return True
+        self.stats.record_refused(label)
+        current_app.logger.warning(f"Wix circuit breaker is open, not sending {label}")
+        return False
+
+    def finish(self, label, collection_id, seconds, error, body):
+        """
+        Records the outcome of one attempt.
+
+        :param error: None on success, else the HTTP status, 'timeout', 'connect' (no connection
+                      could be made) or 'connection' (it broke off).
+        :param body: The response text, or None if there was no response.
+        :return: True if the request should be tried again.
+        """
+        self.stats.record(label, collection_id, seconds, error)
+        if error is None:
+            self.breaker.record_success()
+            return False
+        if body is not None:
+            current_app.logger.error(f"Wix request {label} failed with status {error}: {body}")
+        if not (isinstance(error, str) or error == 429 or error >= 500):
+            self.breaker.record_success()
+            return False
+        if self.breaker.record_failure():
+            current_app.logger.warning(f"Wix circuit breaker opened for {self.breaker.reset_timeout} seconds after {label} failed.")
+        return True
+
+    def snapshot(self):
+        return dict(self.stats.snapshot(), circuit_breaker=self.breaker.stats())
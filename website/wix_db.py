@@ -1,9 +1,26 @@
 import requests
+from urllib3.exceptions import NewConnectionError
 import json
 import os
+import threading
+import time
+from cachetools import LRUCache
 from .models import User  # Add this import if it's not already there
+from .http_client import get_http_session
+from .wix_write_queue import WixWriteQueue
+from .refreshing_cache import RefreshingCache
+from .avatar_selector import AvatarSelectorIndex
+from .async_wix_db import AsyncWixDatabase
+from .wix_mirror import WixMirror
+from .wix_stats import WixStats, endpoint_label
+from .wix_call_policy import WixCallPolicy, not_applied
+from .circuit_breaker import CircuitBreaker
 from flask import current_app, session
 
+# The CandidateData fields a User is built from. Items also carry large 'transcripts' and
+# 'fileLinkTree' JSON strings, which login and update paths never need.
+USER_FIELDS = ('userId', 'cv', 'uses', 'jobTitles')
+
 class WixDatabase:
     def __init__(self, api_key, site_id):
         self.api_key = api_key
@@ -13,10 +30,22 @@ class WixDatabase:
         # the coach pulls straight from the "Agents" collection
         self.template_collection_id = 'Interviews'
         self.avatar_selector_id = 'avatar_selector'
+        self.metrics_collection_id = 'metrics'
         self.base_url = "https://www.wixapis.com/wix-data/v2"
+        # Last known version of items read or written, keyed by (collection, item_id).
+        # Only used by the fallback of patch_item when the patch endpoint is not available.
+        self._items = LRUCache(maxsize=1024)
+        self._items_lock = threading.Lock()
+        self.write_queue = None
+        self.prompt_cache = None
+        self.avatar_index = None
+        self.mirror = None
+        self.stats = WixStats()
+        self.policy = WixCallPolicy(self.stats)
 
     def init_app(self, app):
         app.extensions['wix_db'] = self
+        app.extensions['async_wix_db'] = AsyncWixDatabase(self)
 
         # If api_key and site_id weren't provided in the constructor,
         # try to get them from the app config
@@ -25,7 +54,82 @@ class WixDatabase:
         if not self.site_id:
             self.site_id = app.config.get('WIX_SITE_ID')
 
+        # Retries of reads, and the circuit breaker that stops calls while Wix keeps failing
+        app.config.setdefault('WIX_RETRY_ATTEMPTS', int(os.environ.get('WIX_RETRY_ATTEMPTS', 3)))
+        app.config.setdefault('WIX_RETRY_BACKOFF', float(os.environ.get('WIX_RETRY_BACKOFF', 0.2)))
+        app.config.setdefault('WIX_BREAKER_THRESHOLD', int(os.environ.get('WIX_BREAKER_THRESHOLD', 5)))
+        app.config.setdefault('WIX_BREAKER_RESET', float(os.environ.get('WIX_BREAKER_RESET', 30)))
+        breaker = CircuitBreaker(failure_threshold=app.config['WIX_BREAKER_THRESHOLD'],
+                                 reset_timeout=app.config['WIX_BREAKER_RESET'], name='wix')
+        self.policy = WixCallPolicy(self.stats, breaker, attempts=app.config['WIX_RETRY_ATTEMPTS'],
+                                    backoff=app.config['WIX_RETRY_BACKOFF'])
+
+        # Deferred writes (defer=True) are batched by a background write-behind queue
+        app.config.setdefault('WIX_WRITE_BEHIND', os.environ.get('WIX_WRITE_BEHIND', 'true').lower() == 'true')
+        app.config.setdefault('WIX_FLUSH_INTERVAL', float(os.environ.get('WIX_FLUSH_INTERVAL', 1.0)))
+        app.config.setdefault('WIX_WRITE_ATTEMPTS', int(os.environ.get('WIX_WRITE_ATTEMPTS', 5)))
+        if app.config['WIX_WRITE_BEHIND']:
+            self.write_queue = WixWriteQueue(self, app, flush_interval=app.config['WIX_FLUSH_INTERVAL'],
+                                             max_attempts=app.config['WIX_WRITE_ATTEMPTS'])
+
+        # Prompts change a few times a month; serve them from memory and refresh in the background
+        app.config.setdefault('PROMPT_CACHE_TTL', float(os.environ.get('PROMPT_CACHE_TTL', 600)))
+        app.config.setdefault('PROMPT_CACHE_STALE_TTL', float(os.environ.get('PROMPT_CACHE_STALE_TTL', 86400)))
+        self.prompt_cache = RefreshingCache(self.get_prompt, ttl=app.config['PROMPT_CACHE_TTL'],
+                                            stale_ttl=app.config['PROMPT_CACHE_STALE_TTL'], app=app, name='prompt-cache')
+
+        # Avatar/voice per (interviewType, run). Nothing is fetched until the first lookup, and
+        # refreshes happen only while lookups keep coming, so an unused selector costs no Wix calls
+        app.config.setdefault('AVATAR_SELECTOR_TTL', float(os.environ.get('AVATAR_SELECTOR_TTL', 3600)))
+        self.avatar_index = AvatarSelectorIndex(self, app, ttl=app.config['AVATAR_SELECTOR_TTL'])
+
+        # Optional local SQLite mirror that getters serve from, see WixMirror
+        app.config.setdefault('WIX_MIRROR', os.environ.get('WIX_MIRROR', 'false').lower() == 'true')
+        app.config.setdefault('WIX_MIRROR_PATH', os.environ.get('WIX_MIRROR_PATH', os.path.join(app.instance_path, 'wix_mirror.sqlite3')))
+        app.config.setdefault('WIX_MIRROR_MAX_STALENESS', float(os.environ.get('WIX_MIRROR_MAX_STALENESS', 60)))
+        app.config.setdefault('WIX_MIRROR_SYNC_INTERVAL', float(os.environ.get('WIX_MIRROR_SYNC_INTERVAL', 15)))
+        if app.config['WIX_MIRROR']:
+            self.mirror = WixMirror(
+                self, app, app.config['WIX_MIRROR_PATH'],
+                collections=[self.candidateData_collection_id, self.interview_collection_id,
+                             self.template_collection_id, self.metrics_collection_id],
+                max_staleness=app.config['WIX_MIRROR_MAX_STALENESS'],
+                sync_interval=app.config['WIX_MIRROR_SYNC_INTERVAL']
+            )
+            self.mirror.start()
+
     def _make_request(self, method, endpoint, data=None):
+        """
+        Sends a request to the Wix Data API, retried and guarded by the circuit breaker as
+        WixCallPolicy decides.
+
+        :return: The parsed JSON response, or None on any error.
+        """
+        return self._request(method, endpoint, data)[0]
+
+    def _request(self, method, endpoint, data=None):
+        """
+        _make_request, for writers that need to know whether a failed request may still have
+        been applied (see not_applied).
+
+        :return: A tuple of (parsed JSON response or None, error of the last attempt or None).
+        """
+        label = endpoint_label(method, endpoint)
+        collection_id = (data or {}).get('dataCollectionId')
+        error = None
+        for delay in self.policy.delays(method, endpoint):
+            if delay:
+                time.sleep(delay)
+            if not self.policy.allow(label):
+                return None, 'circuit_open'
+            started = time.perf_counter()
+            error, body = self._send(method, endpoint, data, label)
+            if not self.policy.finish(label, collection_id, time.perf_counter() - started, error, body):
+                return self._parse(label, error, body), error
+        return None, error
+
+    def _send(self, method, endpoint, data, label):
+        # One attempt of _make_request; returns (error, response text), see WixCallPolicy.finish
         headers = {
             'Content-Type': 'application/json',
             'Authorization': self.api_key,
@@ -33,48 +137,63 @@ class WixDatabase:
         }
         url = f"{self.base_url}/{endpoint}"
         try:
-            response = requests.request(method, url, headers=headers, json=data)
-
-            # Attempt to parse JSON response
-            try:
-                response_json = response.json()
-            except json.JSONDecodeError:
-                print("Failed to decode response as JSON.")
-                response_json = None
-
-            # Raise an exception for bad status codes
-            response.raise_for_status()
-            return response_json
+            response = get_http_session().request(method, url, headers=headers, json=data)
+        except requests.exceptions.ConnectTimeout as e:
+            current_app.logger.error(f"Wix request {label} could not connect: {e}")
+            return 'connect', None
+        except requests.exceptions.Timeout as e:
+            current_app.logger.error(f"Wix request {label} timed out: {e}")
+            return 'timeout', None
+        except requests.exceptions.ConnectionError as e:
+            current_app.logger.error(f"Error making request {label}: {e}")
+            # Refused or unresolvable: nothing was sent. Otherwise the connection broke mid-request
+            reason = getattr(e.args[0], 'reason', None) if e.args else None
+            return ('connect' if isinstance(reason, NewConnectionError) else 'connection'), None
         except requests.exceptions.RequestException as e:
-            print(f"Error making request: {e}")
+            current_app.logger.error(f"Error making request {label}: {e}")
+            return 'connection', None
+        return (response.status_code if response.status_code >= 400 else None), response.text
+
+    @staticmethod
+    def _parse(label, error, body):
+        if error is not None:
             return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            current_app.logger.error(f"Failed to decode response of {label} as JSON.")
+            return None
+
+    def wix_stats(self):
+        """
+        :return: Latency histograms and error counts of calls to Wix, and the circuit breaker state.
+        """
+        return self.policy.snapshot()
 
     # ----------------------------------------
     # Basic CRUD Operations
 
 
-    def get_entry(self, item_id):
+    def get_entry(self, item_id, fields=None):
         """
-        Retrieves the entire item data from the RunningInterviews collection.
+        Retrieves item data from the CandidateData collection.
+
+        :param item_id: The ID of the item.
+        :param fields: Optional list of fields to return (plus _id). Pass only what the caller
+                       needs; without it the whole item, transcripts included, is transferred.
+        :return: The item data, or None if not found.
         """
-        endpoint = "items/query"
-        data = {
-            "dataCollectionId": self.candidateData_collection_id,
-            "query": {
-                "filter": {
-                    "_id": item_id  # Ensure '_id' is the correct field name for item ID
-                },
-                "limit": 1
-            }
-        }
+        if self.mirror is not None:
+            mirrored = self.mirror.get(self.candidateData_collection_id, item_id, fields=fields)
+            if mirrored is not None:
+                return mirrored
+
         try:
             current_app.logger.info(f"Fetching item with ID: {item_id} from collection: {self.candidateData_collection_id}")
-            result = self._make_request("POST", endpoint, data)
-            if result and 'dataItems' in result and len(result['dataItems']) > 0:
-                return result['dataItems'][0].get('data', {})
-            else:
+            item = self._query_item(self.candidateData_collection_id, item_id, fields=fields)
+            if item is None:
                 print(f"Item with ID {item_id} not found.")
-                return None
+            return item
         except Exception as e:
             print(f"Error fetching item: {str(e)}")
             return None
@@ -83,6 +202,10 @@ class WixDatabase:
         """
         Retrieves a specific field value for an item from the RunningInterviews collection.
         """
+        mirrored = self._mirrored(self.interview_collection_id, item_id, fields=[field_name])
+        if mirrored is not None:
+            return mirrored.get(field_name)
+
         endpoint = "items/query"
         data = {
             "dataCollectionId": self.interview_collection_id,
@@ -109,34 +232,275 @@ class WixDatabase:
             print(f"Error getting field: {str(e)}")
             return None
 
-    def update_item(self, item_id, field_name, new_value):
+    def get_entries(self, item_ids, fields=None, collection_id=None, chunk_size=100):
         """
-        Updates a specific field value for an item within the RunningInterviews collection without affecting other fields.
+        Retrieves many items by ID with one query per `chunk_size` IDs, using an $in filter.
+
+        :param item_ids: The IDs of the items to fetch.
+        :param fields: Optional list of fields to return (plus _id); all fields if None.
+        :param collection_id: The collection to read, CandidateData by default.
+        :param chunk_size: IDs per query, at most 1000 (the Wix query limit).
+        :return: A dict of item ID to item data; IDs that were not found are missing.
         """
-        # Step 1: Fetch the existing item data
-        existing_data = self.get_entry(item_id)
-        if not existing_data:
-            return f"Item with ID {item_id} not found. Cannot update field '{field_name}'."
+        collection_id = collection_id or self.candidateData_collection_id
+        item_ids = list(dict.fromkeys(item_ids))
+        items = {}
+        for start in range(0, len(item_ids), chunk_size):
+            chunk = item_ids[start:start + chunk_size]
+            query = {
+                "filter": {
+                    "_id": {"$in": chunk}
+                },
+                "limit": len(chunk)
+            }
+            if fields:
+                query["fields"] = list(fields)
+            result = self._make_request("POST", "items/query", {"dataCollectionId": collection_id, "query": query})
+            if result is None:
+                current_app.logger.error(f"Failed to fetch {len(chunk)} items from {collection_id}.")
+                continue
+            for data_item in result.get('dataItems', []):
+                item = data_item.get('data', {})
+                item_id = item.get('_id') or data_item.get('id')
+                items[item_id] = item
+                if not fields:
+                    self._remember_item(collection_id, item_id, item)
+        return items
+
+    def iter_collection(self, collection_id, fields=None, query_filter=None, sort=None, page_size=100):
+        """
+        Streams every item of a collection (or those matching query_filter), one page in memory at a time.
+
+        Follows Wix cursor paging, so it is consistent across pages and does not slow down with
+        depth the way offset paging does.
+
+        :param collection_id: The collection to read.
+        :param fields: Optional list of fields to return (plus _id); all fields if None.
+        :param query_filter: Optional Wix query filter.
+        :param sort: Optional Wix sort, e.g. [{"fieldName": "_updatedDate", "order": "ASC"}].
+        :param page_size: Items per request, at most 1000.
+        :return: A generator of item data dicts.
+        :raises RuntimeError: If a page cannot be fetched; items already yielded stay valid.
+        """
+        query = {"cursorPaging": {"limit": page_size}}
+        if query_filter:
+            query["filter"] = query_filter
+        if sort:
+            query["sort"] = sort
+        if fields:
+            query["fields"] = list(fields)
+
+        while True:
+            result = self._make_request("POST", "items/query", {"dataCollectionId": collection_id, "query": query})
+            if result is None:
+                raise RuntimeError(f"Failed to fetch a page of {collection_id}")
+            data_items = result.get('dataItems', [])
+            for data_item in data_items:
+                yield data_item.get('data', {})
+
+            next_cursor = result.get('pagingMetadata', {}).get('cursors', {}).get('next')
+            if not next_cursor or not data_items:
+                return
+            # Filter, sort and projection are part of the cursor; only the limit may be repeated
+            query = {"cursorPaging": {"limit": page_size, "cursor": next_cursor}}
+
+    def update_item(self, item_id, field_name, new_value, defer=False):
+        """
+        Updates a specific field value for an item within the CandidateData collection without affecting other fields.
+
+        :param defer: Queue the update on the write-behind queue instead of waiting for Wix.
+        """
+        if defer and self.write_queue is not None:
+            self.write_queue.enqueue(item_id, fields={field_name: new_value})
+            return f"Field '{field_name}' update queued for item ID: {item_id}"
+        result = self.patch_item(item_id, fields={field_name: new_value})
+        if result is not None:
+            return f"Field '{field_name}' updated successfully for item ID: {item_id}"
+        return f"Failed to update field '{field_name}' for item ID: {item_id}"
+
+    def patch_item(self, item_id, fields=None, increments=None, collection_id=None):
+        """
+        Changes only the given fields of an item, in a single request.
+
+        Uses the Wix Data patch endpoint, which applies the field modifications on the server, so
+        concurrent writers to other fields (or increments of the same field) do not overwrite
+        each other. Only if Wix rejects the patch with a 4xx status (other than 429) does this
+        fall back to _put_with_cached_item. After a timeout, a dropped connection or a 5xx the
+        patch may have been applied, and sending its increments again would count them twice,
+        so the update is given up instead.
 
-        # Step 2: Modify the desired field
-        existing_data[field_name] = new_value
+        :param item_id: The ID of the item to update.
+        :param fields: A dict of field names to their new values.
+        :param increments: A dict of numeric field names to the amount to add.
+        :param collection_id: The collection of the item, CandidateData by default.
+        :return: The updated item data, or None if the update failed.
+        """
+        collection_id = collection_id or self.candidateData_collection_id
+        fields = fields or {}
+        increments = increments or {}
+        if not fields and not increments:
+            return self._cached_item(collection_id, item_id) or {}
 
-        # Step 3: Send the complete data back to update the item
         endpoint = f"items/{item_id}"
         data = {
-            "dataCollectionId": self.candidateData_collection_id,
-            "dataItem": {
-                "data": existing_data
+            "dataCollectionId": collection_id,
+            "patchSet": {
+                "dataItemId": item_id,
+                "fieldModifications": self._field_modifications(fields, increments)
             }
         }
-        try:
-            result = self._make_request("PUT", endpoint, data)
-            if result and 'dataItem' in result:
-                return f"Field '{field_name}' updated successfully for item ID: {item_id}"
+        result, error = self._request("PATCH", endpoint, data)
+        if result and 'dataItem' in result:
+            item = result['dataItem'].get('data', {})
+            self._remember_item(collection_id, item_id, item)
+            return item
+
+        if not_applied(error) and isinstance(error, int) and error != 429:
+            current_app.logger.warning(f"Patch of item {item_id} in {collection_id} was rejected ({error}), falling back to a full update.")
+            return self._put_with_cached_item(collection_id, item_id, fields, increments)
+        # The cached version may be out of date if the patch went through after all
+        self._forget_item(collection_id, item_id)
+        current_app.logger.error(f"Patch of item {item_id} in {collection_id} failed ({error}): {fields} {increments}")
+        return None
+
+    def bulk_patch_items(self, patches, collection_id=None):
+        """
+        Applies partial updates to several items of one collection in a single request.
+
+        :param patches: A dict of item_id to a (fields, increments) tuple, as for patch_item.
+        :param collection_id: The collection of the items, CandidateData by default.
+        :return: A tuple of (IDs of the items that were updated, IDs of the items that certainly
+                 were not). Items in neither set may or may not have been updated, e.g. after a
+                 timeout; sending their increments again could count them twice.
+        """
+        collection_id = collection_id or self.candidateData_collection_id
+        patch_sets = [
+            {"dataItemId": item_id, "fieldModifications": self._field_modifications(fields, increments)}
+            for item_id, (fields, increments) in patches.items()
+            if fields or increments
+        ]
+        if not patch_sets:
+            return set(), set()
+
+        data = {
+            "dataCollectionId": collection_id,
+            "patchSets": patch_sets,
+            "returnEntity": False
+        }
+        result, error = self._request("POST", "bulk/items/patch", data)
+        if not result or 'results' not in result:
+            current_app.logger.error(f"Bulk patch of {len(patch_sets)} items in {collection_id} failed ({error}). Response: {result}")
+            item_ids = {patch_set['dataItemId'] for patch_set in patch_sets}
+            for item_id in item_ids:
+                self._forget_item(collection_id, item_id)
+            return set(), (item_ids if not_applied(error) else set())
+
+        updated = set()
+        rejected = set()
+        for item_result in result['results']:
+            metadata = item_result.get('itemMetadata', {})
+            if metadata.get('success'):
+                updated.add(metadata.get('id'))
+                # The new item version was not returned, so the cached one is out of date
+                self._forget_item(collection_id, metadata.get('id'))
             else:
-                return f"Failed to update field '{field_name}'. Response: {result}"
-        except Exception as e:
-            return f"Error updating field '{field_name}': {str(e)}"
+                rejected.add(metadata.get('id'))
+                current_app.logger.error(f"Bulk patch failed for item {metadata.get('id')}: {metadata.get('error')}")
+        return updated, rejected
+
+    def _field_modifications(self, fields, increments):
+        modifications = [
+            {"fieldPath": field_name, "action": "SET_FIELD", "setFieldOptions": {"value": value}}
+            for field_name, value in (fields or {}).items()
+        ]
+        modifications += [
+            {"fieldPath": field_name, "action": "INCREMENT_FIELD", "incrementFieldOptions": {"value": amount}}
+            for field_name, amount in (increments or {}).items()
+        ]
+        return modifications
+
+    def _put_with_cached_item(self, collection_id, item_id, fields, increments):
+        """
+        Fallback for patch_item: writes the whole item, based on the cached version when it is current.
+        A PUT replaces the item, so unlike the patch path this one needs every field of it.
+
+        Only the item's _updatedDate is read to check the cached version. If another writer has
+        changed the item since it was cached, the item is read again so that change is kept.
+        Wix has no conditional PUT, so a write between that check and the PUT is still lost;
+        this is why the fallback is only taken when the patch endpoint itself rejected the update.
+        """
+        cached = self._cached_item(collection_id, item_id)
+        if cached is not None:
+            current = self._query_item(collection_id, item_id, fields=['_updatedDate'])
+            if current is None or current.get('_updatedDate') != cached.get('_updatedDate'):
+                current_app.logger.info(f"Cached item {item_id} in {collection_id} is out of date, reloading it.")
+                cached = None
+        if cached is None:
+            cached = self._query_item(collection_id, item_id)
+            if cached is None:
+                current_app.logger.error(f"Item with ID {item_id} not found in {collection_id}.")
+                return None
+
+        item = dict(cached)
+        item.update(fields or {})
+        for field_name, amount in (increments or {}).items():
+            item[field_name] = (item.get(field_name) or 0) + amount
+
+        endpoint = f"items/{item_id}"
+        data = {
+            "dataCollectionId": collection_id,
+            "dataItem": {
+                "data": item
+            }
+        }
+        result = self._make_request("PUT", endpoint, data)
+        if result and 'dataItem' in result:
+            item = result['dataItem'].get('data', item)
+            self._remember_item(collection_id, item_id, item)
+            return item
+
+        self._forget_item(collection_id, item_id)
+        current_app.logger.error(f"Failed to update item {item_id} in {collection_id}. Response: {result}")
+        return None
+
+    def _query_item(self, collection_id, item_id, fields=None):
+        query = {
+            "filter": {
+                "_id": item_id
+            },
+            "limit": 1
+        }
+        if fields:
+            query["fields"] = list(fields)
+        result = self._make_request("POST", "items/query", {"dataCollectionId": collection_id, "query": query})
+        if result and 'dataItems' in result and len(result['dataItems']) > 0:
+            item = result['dataItems'][0].get('data', {})
+            if not fields:
+                self._remember_item(collection_id, item_id, item)
+            return item
+        return None
+
+    def _cached_item(self, collection_id, item_id):
+        with self._items_lock:
+            return self._items.get((collection_id, item_id))
+
+    def _remember_item(self, collection_id, item_id, item):
+        with self._items_lock:
+            self._items[(collection_id, item_id)] = dict(item)
+        # Write-through: the mirror gets the new version without waiting for its next sync
+        if self.mirror is not None:
+            self.mirror.store(collection_id, item)
+
+    def _forget_item(self, collection_id, item_id):
+        with self._items_lock:
+            self._items.pop((collection_id, item_id), None)
+        if self.mirror is not None:
+            self.mirror.discard(collection_id, item_id)
+
+    def _mirrored(self, collection_id, item_id, fields=None):
+        if self.mirror is None:
+            return None
+        return self.mirror.get(collection_id, item_id, fields=fields)
 
     def remove_item(self, item_id, field_name):
         """
@@ -151,34 +515,21 @@ class WixDatabase:
     # ----------------------------------------
     # User Management
     # ----------------------------------------
-    def get_user(self, item_id):
+    def get_user(self, item_id, fields=USER_FIELDS):
         """
         Fetches user data based on item_id from the CandidateData collection and returns a User instance.
+
+        :param fields: The fields to fetch, by default only those the User is built from.
+                       None fetches the whole item.
         """
-        endpoint = "items/query"
-        data = {
-            "dataCollectionId": "CandidateData",  # New collection name
-            "query": {
-                "filter": {
-                    "_id": item_id
-                },
-                "limit": 1
-            }
-        }
+        mirrored = self.mirror.get(self.candidateData_collection_id, item_id, fields=fields) if self.mirror is not None else None
+        if mirrored is not None:
+            return self._user_from_item(item_id, mirrored)
 
         try:
-            result = self._make_request("POST", endpoint, data)
-
-            if result and 'dataItems' in result and len(result['dataItems']) > 0:
-                user_data = result['dataItems'][0].get('data', {})
-
-                return User(
-                    item_id=item_id,
-                    user_id=user_data.get('userId'),
-                    cv_path=user_data.get('cv'),  # This now contains the document from CMS
-                    uses=user_data.get('uses'),
-                    job_titles=user_data.get('jobTitles')
-                )
+            user_data = self._query_item(self.candidateData_collection_id, item_id, fields=fields)
+            if user_data is not None:
+                return self._user_from_item(item_id, user_data)
             else:
                 current_app.logger.error(f"User not found with item_id: {item_id}")
                 return None
@@ -187,6 +538,15 @@ class WixDatabase:
             current_app.logger.error(f"Error fetching user: {str(e)}")
             return None
 
+    def _user_from_item(self, item_id, user_data):
+        return User(
+            item_id=item_id,
+            user_id=user_data.get('userId'),
+            cv_path=user_data.get('cv'),  # This now contains the document from CMS
+            uses=user_data.get('uses'),
+            job_titles=user_data.get('jobTitles')
+        )
+
     def update_user(self, item_id, **fields_to_update):
         """
         Updates specified fields for a user within the RunningInterviews collection.
@@ -215,28 +575,15 @@ class WixDatabase:
 
         session.modified = True
 
-        # Use a temporary dictionary to modify the data, because the _id field is read-only it will not do anything, but thats ok.
-        user_data_swap = user_data.copy()
-        user_data_swap['_id'] = user_data_swap.pop('item_id', item_id)
+        # Only the changed fields (or, without any, the user's session fields) are sent.
+        # The item_id is the item's _id, which is read-only and not a field to patch.
+        changed_fields = dict(fields_to_update) if fields_to_update else user_data.copy()
+        changed_fields.pop('item_id', None)
 
-        # Prepare the data for updating in the database
-        endpoint = f"items/{item_id}"
-        data = {
-            "dataCollectionId": self.interview_collection_id,
-            "dataItem": {
-                "data": user_data_swap
-            }
-        }
-
-        try:
-            # Send a single request to update the item in the database
-            result = self._make_request("PUT", endpoint, data)
-            if result and 'dataItem' in result:
-                return f"User data updated successfully for item ID: {item_id}"
-            else:
-                return f"Failed to update user data. Response: {result}"
-        except Exception as e:
-            return f"Error updating user data: {str(e)}"
+        result = self.patch_item(item_id, fields=changed_fields, collection_id=self.interview_collection_id)
+        if result is not None:
+            return f"User data updated successfully for item ID: {item_id}"
+        return f"Failed to update user data for item ID: {item_id}"
 
     # ----------------------------------------
     # Coach Interactions Management
@@ -255,7 +602,7 @@ class WixDatabase:
     # ----------------------------------------
     # Coach Interactions Management
     # ----------------------------------------
-    def update_job_title(self, item_id, new_job_title):
+    def update_job_title(self, item_id, new_job_title, defer=False):
         current_app.logger.info(f"Updating job title for item {item_id} to {new_job_title}")
         """
         Updates the 'coachInteractions' field for a specific item.
@@ -265,39 +612,21 @@ class WixDatabase:
                                     Should be a string containing the coach interactions.
         :return: Success or error message.
         """
-        return self.update_item(item_id, 'jobTitles', new_job_title)
+        return self.update_item(item_id, 'jobTitles', new_job_title, defer=defer)
 
-    def update_use_count(self, item_id):
+    def update_use_count(self, item_id, defer=False):
         """
-        Increments the 'uses' count by 1 for an item within the RunningInterviews collection.
-        """
-        # Step 1: Fetch the existing item data
-        existing_data = self.get_entry(item_id)
-        if not existing_data:
-            return f"Item with ID {item_id} not found. Cannot increment 'uses' field."
-
-        # Step 2: Increment the 'uses' field
-        field_name = "uses"
-        current_value = existing_data.get(field_name, 0)  # Default to 0 if field doesn't exist
-        new_value = current_value + 1
-        existing_data[field_name] = new_value
+        Increments the 'uses' count by 1 for an item within the CandidateData collection.
 
-        # Step 3: Send the complete data back to update the item
-        endpoint = f"items/{item_id}"
-        data = {
-            "dataCollectionId": self.candidateData_collection_id,
-            "dataItem": {
-                "data": existing_data
-            }
-        }
-        try:
-            result = self._make_request("PUT", endpoint, data)
-            if result and 'dataItem' in result:
-                return f"'uses' field incremented to {new_value} successfully for item ID: {item_id}"
-            else:
-                return f"Failed to increment 'uses' field. Response: {result}"
-        except Exception as e:
-            return f"Error incrementing 'uses' field: {str(e)}"
+        :param defer: Queue the increment on the write-behind queue instead of waiting for Wix.
+        """
+        if defer and self.write_queue is not None:
+            self.write_queue.enqueue(item_id, increments={'uses': 1})
+            return f"'uses' increment queued for item ID: {item_id}"
+        result = self.patch_item(item_id, increments={'uses': 1})
+        if result is not None:
+            return f"'uses' field incremented to {result.get('uses')} successfully for item ID: {item_id}"
+        return f"Failed to increment 'uses' field for item ID: {item_id}"
     # ----------------------------------------
     # Pull Prompt
     # In the coach, we pull from the "Agents" collection. That is we pull the agent rules and then later combine it with
@@ -314,6 +643,11 @@ class WixDatabase:
 
         #level_string = f"Level {run}" if run != 99 else "Demo"
 
+        if self.mirror is not None:
+            mirrored = self.mirror.find_first(self.template_collection_id, 'interviewTitle', interviewTitle, fields=['prompt'])
+            if mirrored is not None:
+                return mirrored.get('prompt')
+
         endpoint = "items/query"
         data = {
             "dataCollectionId": self.template_collection_id,
@@ -337,6 +671,22 @@ class WixDatabase:
             print(f"Error getting prompt: {str(e)}")
             return None
 
+    def get_cached_prompt(self, interviewTitle):
+        """
+        Returns the prompt for interviewTitle from the prompt cache, see RefreshingCache.
+        Only the first request for a title that was neither seeded nor loaded waits for Wix.
+        """
+        if self.prompt_cache is None:
+            return self.get_prompt(interviewTitle)
+        return self.prompt_cache.get(interviewTitle)
+
+    def invalidate_prompt(self, interviewTitle=None):
+        """
+        Drops a cached prompt (or all of them) so the next request reloads it from Wix.
+        """
+        if self.prompt_cache is not None:
+            self.prompt_cache.invalidate(interviewTitle)
+
     # ----------------------------------------
     # Pull avatar_selector.json
     # ----------------------------------------
@@ -551,88 +901,114 @@ class WixDatabase:
     # ----------------------------------------
     def update_user_metrics(self, session_metrics):
         """
-        Updates the 'metrics' collection with user metrics from the session.
+        Updates the 'metrics' collection with user metrics from the session: numeric metrics
+        are added to the stored ones, any other fields replace the stored values.
         """
         if not session_metrics or 'user_ID' not in session_metrics:
             return "Error: Invalid metrics data or missing user_ID"
 
         user_id = session_metrics['user_ID']
-        metrics_collection_id = 'metrics'
+        deltas = {}
+        values = {}
+        for key, value in session_metrics.items():
+            if key == 'user_ID':
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                deltas[key] = value
+            else:
+                values[key] = value
+        if user_id in self.increment_user_metrics({user_id: deltas}, values_by_user={user_id: values}):
+            return f"Metrics updated successfully for user_ID: {user_id}"
+        return f"Failed to update metrics for user_ID: {user_id}"
+
+    def get_user_metrics(self, user_id, fields=None):
+        """
+        Retrieves a user's item from the 'metrics' collection.
+
+        :param fields: Optional list of fields to return (plus _id).
+        :return: The item data, or None if the user has no metrics stored or the query failed.
+        """
+        query = {
+            "filter": {
+                "user_ID": user_id
+            },
+            "limit": 1
+        }
+        if fields:
+            query["fields"] = list(fields)
+        result = self._make_request("POST", "items/query", {"dataCollectionId": self.metrics_collection_id, "query": query})
+        if result and result.get('dataItems'):
+            return result['dataItems'][0].get('data', {})
+        return None
+
+    def increment_user_metrics(self, deltas_by_user, values_by_user=None):
+        """
+        Adds metric deltas to the users' items in the 'metrics' collection, creating missing items.
+
+        Existing items are found with one query and incremented on the server with one bulk patch;
+        new users are created with one bulk insert. Nothing is summed client-side, so concurrent
+        flushes from several workers do not lose each other's counts.
+
+        :param deltas_by_user: A dict of user_ID to a dict of metric names and amounts to add.
+        :param values_by_user: A dict of user_ID to a dict of fields to set, sent in the same requests.
+        :return: The set of user_IDs whose deltas were stored, or may have been (after a timeout,
+                 say). Only the others are safe to send again without counting anything twice.
+        """
+        values_by_user = values_by_user or {}
+        user_ids = [user_id for user_id in dict.fromkeys([*deltas_by_user, *values_by_user])
+                    if deltas_by_user.get(user_id) or values_by_user.get(user_id)]
+        if not user_ids:
+            return set()
 
-        # First, query to check if the user already has metrics
-        endpoint = "items/query"
         query_data = {
-            "dataCollectionId": metrics_collection_id,
+            "dataCollectionId": self.metrics_collection_id,
             "query": {
                 "filter": {
-                    "user_ID": user_id
+                    "user_ID": {"$in": user_ids}
                 },
-                "limit": 1
+                "fields": ["user_ID"],
+                "limit": len(user_ids)
             }
         }
-
-        try:
-            current_app.logger.info(f"Checking for existing metrics for user_ID: {user_id}")
-            result = self._make_request("POST", endpoint, query_data)
-
-            # If user metrics exist, update them
-            if result and 'dataItems' in result and len(result['dataItems']) > 0:
-                # The document ID is in 'id', not '_id'
-                document_id = result['dataItems'][0].get('id')
-                current_app.logger.info(f"Found existing metrics with document ID: {document_id}")
-
-                # Get the existing metrics from the nested data object
-                existing_metrics = result['dataItems'][0].get('data', {})
-                updated_metrics = existing_metrics.copy()
-
-                # Update all numeric fields by adding session values
-                for key, value in session_metrics.items():
-                    if key == 'user_ID':
-                        continue  # Skip the user_ID field
-
-                    if key in updated_metrics and isinstance(value, (int, float)):
-                        updated_metrics[key] = updated_metrics.get(key, 0) + value
-                    else:
-                        updated_metrics[key] = value
-
-                # Update the item using the document ID
-                update_endpoint = f"items/{document_id}"
-                update_data = {
-                    "dataCollectionId": metrics_collection_id,
-                    "dataItem": {
-                        "data": updated_metrics
-                    }
-                }
-
-                result = self._make_request("PUT", update_endpoint, update_data)
-                if result and 'dataItem' in result:
-                    current_app.logger.info(f"Updated metrics for user_ID: {user_id}")
-                    return f"Metrics updated successfully for user_ID: {user_id}"
-                else:
-                    current_app.logger.error(f"Failed to update metrics. Response: {result}")
-                    return f"Failed to update metrics. Response: {result}"
-
-            # If no metrics exist, create a new entry
-            else:
-                current_app.logger.info(f"No existing metrics found for user_ID: {user_id}. Creating new entry.")
-
-                # Create a new item
-                create_endpoint = "items"
-                create_data = {
-                    "dataCollectionId": metrics_collection_id,
-                    "dataItem": {
-                        "data": session_metrics
-                    }
-                }
-
-                result = self._make_request("POST", create_endpoint, create_data)
-                if result and 'dataItem' in result:
-                    current_app.logger.info(f"Created new metrics for user_ID: {user_id}")
-                    return f"Metrics created successfully for user_ID: {user_id}"
-                else:
-                    current_app.logger.error(f"Failed to create metrics. Response: {result}")
-                    return f"Failed to create metrics. Response: {result}"
-
-        except Exception as e:
-            current_app.logger.error(f"Error updating user metrics: {str(e)}")
-            return f"Error updating user metrics: {str(e)}"
+        result = self._make_request("POST", "items/query", query_data)
+        if result is None:
+            current_app.logger.error("Failed to look up existing metrics items.")
+            return set()
+
+        # The document ID is in 'id', not '_id'
+        document_ids = {}
+        for data_item in result.get('dataItems', []):
+            document_ids[data_item.get('data', {}).get('user_ID')] = data_item.get('id') or data_item.get('data', {}).get('_id')
+
+        stored = set()
+        existing = {document_ids[user_id]: user_id for user_id in user_ids if user_id in document_ids}
+        if existing:
+            _, rejected = self.bulk_patch_items(
+                {document_id: (values_by_user.get(user_id) or {}, deltas_by_user.get(user_id) or {})
+                 for document_id, user_id in existing.items()},
+                collection_id=self.metrics_collection_id
+            )
+            stored.update(user_id for document_id, user_id in existing.items() if document_id not in rejected)
+
+        new_user_ids = [user_id for user_id in user_ids if user_id not in document_ids]
+        if new_user_ids:
+            insert_data = {
+                "dataCollectionId": self.metrics_collection_id,
+                "dataItems": [{"data": dict(values_by_user.get(user_id) or {}, **(deltas_by_user.get(user_id) or {}), user_ID=user_id)}
+                              for user_id in new_user_ids],
+                "returnEntity": False
+            }
+            result, error = self._request("POST", "bulk/items/insert", insert_data)
+            for item_result in (result or {}).get('results', []):
+                metadata = item_result.get('itemMetadata', {})
+                index = metadata.get('originalIndex')
+                if metadata.get('success') and index is not None and index < len(new_user_ids):
+                    stored.add(new_user_ids[index])
+            if result is None:
+                current_app.logger.error(f"Failed to create metrics for {len(new_user_ids)} users ({error}).")
+                if not not_applied(error):
+                    # The items may exist now; inserting them again would duplicate them
+                    stored.update(new_user_ids)
+
+        current_app.logger.info(f"Flushed metrics for {len(stored)} of {len(user_ids)} users.")
+        return stored
@@ -0,0 +1,291 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    user_id TEXT,
+    interview_title TEXT,
+    updated_date TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS items_user_id ON items (collection, user_id);
+CREATE INDEX IF NOT EXISTS items_interview_title ON items (collection, interview_title);
+CREATE TABLE IF NOT EXISTS sync_state (
+    collection TEXT PRIMARY KEY,
+    cursor TEXT,
+    synced_at REAL,
+    full_synced_at REAL
+);
+"""
+
+# Item fields with a secondary index, and the column holding them
+INDEXED_FIELDS = {'userId': 'user_id', 'interviewTitle': 'interview_title'}
+
+# Never written to the mirror: interview transcripts are personal data that should not sit in
+# an unencrypted local file, and both fields are large. Reads that need them go to Wix.
+OMITTED_FIELDS = ('transcripts', 'fileLinkTree')
+# Set on mirrored items that had omitted fields removed
+OMITTED_MARKER = '_mirrorOmitted'
+
+def lock_exclusive(lock_file):
+    """
+    Takes an exclusive lock on an open file without blocking.
+
+    :raises OSError: If another process holds the lock.
+    """
+    # fcntl only exists on POSIX, msvcrt only on Windows; imported here so either platform can import the module
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        return
+    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+def updated_date(item):
+    # Wix returns dates either as an ISO string or as {"$date": "<ISO string>"}
+    value = item.get('_updatedDate')
+    if isinstance(value, dict):
+        value = value.get('$date')
+    return value
+
+class WixMirror:
+    """
+    Local SQLite copy of Wix collections, kept up to date incrementally.
+
+    A background thread asks Wix every `sync_interval` seconds for the items of each
+    collection whose _updatedDate is at or after the newest one already mirrored, and
+    upserts them. Every `full_sync_interval` seconds a collection is copied in full instead,
+    which also drops items that were deleted in Wix (incremental syncs cannot see deletes).
+
+    Reads are bounded in staleness: a collection that has not synced successfully in the
+    last `max_staleness` seconds is not served from, so callers fall back to Wix. Writes made
+    through WixDatabase go to the mirror as well (see store and discard).
+
+    All worker processes of a host share the file, and only one of them syncs: the one holding
+    an exclusive lock on `<path>.lock`. The others keep trying to take the lock, so another
+    worker takes over when the syncer exits. Wix load therefore does not grow with the number
+    of workers.
+
+    OMITTED_FIELDS are stripped before items are stored, so transcripts are never written to
+    disk; a read of an item without projection, or of an omitted field, goes to Wix instead.
+    Mirrored items live as long as they exist in Wix; delete the file to drop the mirror.
+    """
+    def __init__(self, wix_db, app, path, collections, max_staleness=60, sync_interval=15, full_sync_interval=3600, page_size=100):
+        self.wix_db = wix_db
+        self.app = app
+        self.path = path
+        self.collections = tuple(collections)
+        self.max_staleness = max_staleness
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self.page_size = page_size
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.worker = None
+        self.worker_pid = None
+        self.lock_path = f'{path}.lock'
+        self.lock_file = None
+        self.lock_pid = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by all threads of the process, serialized by self.lock
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+    def is_fresh(self, collection):
+        with self.lock:
+            row = self.connection.execute("SELECT synced_at FROM sync_state WHERE collection = ?", (collection,)).fetchone()
+        return row is not None and row[0] is not None and time.time() - row[0] <= self.max_staleness
+
+    def get(self, collection, item_id, fields=None):
+        """
+        :return: The mirrored item data (only `fields`, if given), or None if it is not mirrored
+                 or the collection is too stale to serve from.
+        """
+        if not self.is_fresh(collection):
+            return None
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM items WHERE collection = ? AND id = ?",
+                                          (collection, item_id)).fetchone()
+        return self._project(json.loads(row[0]), fields) if row else None
+
+    def find_first(self, collection, field, value, fields=None):
+        """
+        Looks an item up by one of the indexed fields ('userId' or 'interviewTitle').
+
+        :return: The first matching item data, or None (also when the collection is stale).
+        """
+        column = INDEXED_FIELDS[field]
+        if not self.is_fresh(collection):
+            return None
+        with self.lock:
+            row = self.connection.execute(f"SELECT data FROM items WHERE collection = ? AND {column} = ? LIMIT 1",
+                                          (collection, value)).fetchone()
+        return self._project(json.loads(row[0]), fields) if row else None
+
+    def _project(self, item, fields):
+        # None if the item lacks omitted fields that were asked for (all of them, without fields)
+        omitted = item.pop(OMITTED_MARKER, None)
+        if omitted and (not fields or any(name in omitted for name in fields)):
+            return None
+        if not fields:
+            return item
+        return {name: item[name] for name in ['_id', *fields] if name in item}
+
+    # ----------------------------------------
+    # Writes
+    # ----------------------------------------
+    def store(self, collection, item):
+        """
+        Upserts a full item, e.g. after it was written to Wix. Partial items are ignored.
+        """
+        if collection not in self.collections or not item.get('_id') or not updated_date(item):
+            return
+        with self.lock:
+            self._upsert(collection, [item])
+
+    def discard(self, collection, item_id):
+        """
+        Drops an item whose new version is unknown; it is served from Wix until the next sync.
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM items WHERE collection = ? AND id = ?", (collection, item_id))
+
+    def _upsert(self, collection, items):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO items (collection, id, user_id, interview_title, updated_date, data) VALUES (?, ?, ?, ?, ?, ?)",
+            [(collection, item['_id'], item.get('userId'), item.get('interviewTitle'), updated_date(item), json.dumps(self._strip(item)))
+             for item in items]
+        )
+
+    def _strip(self, item):
+        omitted = [name for name in OMITTED_FIELDS if name in item]
+        if not omitted:
+            return item
+        item = {name: value for name, value in item.items() if name not in omitted}
+        item[OMITTED_MARKER] = omitted
+        return item
+
+    # ----------------------------------------
+    # Sync
+    # ----------------------------------------
+    def start(self):
+        """
+        Starts the background sync thread (again, after a fork).
+        """
+        if self.worker is not None and self.worker_pid == os.getpid() and self.worker.is_alive():
+            return
+        self.worker = threading.Thread(target=self._run, name='wix-mirror', daemon=True)
+        self.worker_pid = os.getpid()
+        self.worker.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def sync(self, collection, full=False):
+        """
+        Copies new and changed items of a collection from Wix.
+
+        :param full: Copy the whole collection and drop items that no longer exist.
+        :return: The number of items copied, or None if the sync failed.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT cursor, full_synced_at FROM sync_state WHERE collection = ?",
+                                          (collection,)).fetchone()
+        cursor = None if full or row is None else row[0]
+
+        # $gte, not $gt: items sharing the newest timestamp may not all have been copied yet
+        query_filter = {"_updatedDate": {"$gte": {"$date": cursor}}} if cursor else None
+
+        started_at = time.time()
+        seen_ids = set()
+        newest = cursor
+        copied = 0
+        page = []
+        try:
+            for item in self.wix_db.iter_collection(collection, query_filter=query_filter, page_size=self.page_size,
+                                                    sort=[{"fieldName": "_updatedDate", "order": "ASC"}]):
+                if not item.get('_id'):
+                    continue
+                page.append(item)
+                seen_ids.add(item['_id'])
+                if updated_date(item) and (newest is None or updated_date(item) > newest):
+                    newest = updated_date(item)
+                if len(page) >= self.page_size:
+                    with self.lock:
+                        self._upsert(collection, page)
+                    copied += len(page)
+                    page = []
+        except RuntimeError as e:
+            self.app.logger.error(f"Mirror sync of {collection} failed: {str(e)}")
+            return None
+        with self.lock:
+            self._upsert(collection, page)
+        copied += len(page)
+
+        with self.lock:
+            if full:
+                self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS seen_ids (id TEXT PRIMARY KEY)")
+                self.connection.execute("DELETE FROM seen_ids")
+                self.connection.executemany("INSERT OR IGNORE INTO seen_ids (id) VALUES (?)", [(item_id,) for item_id in seen_ids])
+                self.connection.execute("DELETE FROM items WHERE collection = ? AND id NOT IN (SELECT id FROM seen_ids)",
+                                        (collection,))
+            full_synced_at = started_at if full else (row[1] if row else None)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sync_state (collection, cursor, synced_at, full_synced_at) VALUES (?, ?, ?, ?)",
+                (collection, newest, started_at, full_synced_at)
+            )
+        return copied
+
+    def sync_all(self):
+        for collection in self.collections:
+            with self.lock:
+                row = self.connection.execute("SELECT full_synced_at FROM sync_state WHERE collection = ?",
+                                              (collection,)).fetchone()
+            full = row is None or row[0] is None or time.time() - row[0] >= self.full_sync_interval
+            try:
+                self.sync(collection, full=full)
+            except Exception as e:
+                self.app.logger.error(f"Error syncing {collection} to the mirror: {str(e)}")
+
+    def is_syncer(self):
+        """
+        Takes the host-wide sync lock if no other process holds it.
+
+        :return: True if this process holds the lock.
+        """
+        if self.lock_file is not None and self.lock_pid == os.getpid():
+            return True
+        # A lock file inherited through fork belongs to the parent
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            lock_exclusive(lock_file)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        self.lock_pid = os.getpid()
+        return True
+
+    def _run(self):
+        while True:
+            if self.is_syncer():
+                with self.app.app_context():
+                    self.sync_all()
+            if self.stop_event.wait(self.sync_interval):
+                return
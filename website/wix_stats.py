@@ -0,0 +1,121 @@
+import bisect
+import re
+import threading
+
+# Upper bounds in milliseconds of the latency histogram buckets; slower calls go in a last, open bucket
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000)
+
+# Item IDs in endpoints are replaced so that e.g. every items/{id} PATCH is counted together
+_ITEM_ID = re.compile(r'^(items)/(?!(query|count|aggregate|distinct)$)[^/]+$')
+_ITEM_ID_PLACEHOLDER = r'\1/:id'
+
+def endpoint_label(method, endpoint):
+    """
+    :return: e.g. "POST items/query" or "PATCH items/:id".
+    """
+    return f"{method} {_ITEM_ID.sub(_ITEM_ID_PLACEHOLDER, endpoint)}"
+
+# POST endpoints that only read, and so are as safe to retry as a GET
+IDEMPOTENT_POSTS = ('items/query',)
+
+def is_idempotent(method, endpoint):
+    return method == 'GET' or (method == 'POST' and endpoint in IDEMPOTENT_POSTS)
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram. Not thread-safe on its own, WixStats locks around it.
+    """
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        """
+        :return: The upper bound of the bucket holding the given fraction of calls (the
+                 largest latency seen for the open bucket), or None without any calls.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self):
+        buckets = {f'le_{bound}': count for bound, count in zip(self.bounds, self.counts)}
+        buckets['inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 1) if self.count else None,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max_ms, 1),
+            'buckets': buckets,
+        }
+
+class WixStats:
+    """
+    Per-process latency histograms and error counts of calls to Wix, per endpoint and per collection.
+
+    Every attempt is recorded, retries included, so the histograms show what Wix itself
+    delivers. Errors are counted by kind: the HTTP status, 'timeout', 'connect' (no
+    connection could be made), 'connection' (it broke off) or 'circuit_open' for calls the
+    circuit breaker refused.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}    # label -> LatencyHistogram
+        self.collections = {}  # collection -> LatencyHistogram
+        self.errors = {}       # label -> {kind: count}
+        self.retries = 0
+
+    def record(self, label, collection, seconds, error=None):
+        ms = seconds * 1000
+        with self.lock:
+            self.endpoints.setdefault(label, LatencyHistogram()).observe(ms)
+            if collection:
+                self.collections.setdefault(collection, LatencyHistogram()).observe(ms)
+            if error is not None:
+                self._count_error(label, error)
+
+    def _count_error(self, label, kind):
+        # Called with self.lock held
+        errors = self.errors.setdefault(label, {})
+        errors[str(kind)] = errors.get(str(kind), 0) + 1
+
+    def record_refused(self, label):
+        with self.lock:
+            self._count_error(label, 'circuit_open')
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'endpoints': {label: histogram.to_dict() for label, histogram in self.endpoints.items()},
+                'collections': {collection: histogram.to_dict() for collection, histogram in self.collections.items()},
+                'errors': {label: dict(errors) for label, errors in self.errors.items()},
+                'retries': self.retries,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+            self.collections.clear()
+            self.errors.clear()
+            self.retries = 0
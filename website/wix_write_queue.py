@@ -0,0 +1,183 @@
+import atexit
+import os
+import random
+import threading
+import time
+
+class WixWriteQueue:
+    """
+    Write-behind queue for partial item updates to Wix.
+
+    Updates are collected per item and sent by a background thread every `flush_interval`
+    seconds through WixDatabase.bulk_patch_items, one request per collection. Several
+    updates to the same item before a flush become one patch: later field values replace
+    earlier ones, increments add up, and an increment after a value is set is applied to it.
+
+    Items the bulk request certainly did not update (Wix rejected them, or the request never
+    reached it) are retried with exponential backoff and jitter. The last attempt goes through
+    WixDatabase.patch_item on its own, which can fall back to a full update. After a failure
+    that may have been applied anyway, such as a timeout, only the field values are sent again:
+    repeating the increments could count them twice, so they are dropped and logged.
+    Pending updates are flushed when the process exits.
+    """
+    def __init__(self, wix_db, app, flush_interval=1.0, max_attempts=5, max_batch=100):
+        self.wix_db = wix_db
+        self.app = app
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_batch = max_batch
+        self.pending = {}  # (collection_id, item_id) -> {'fields', 'increments', 'attempts', 'not_before'}
+        self.condition = threading.Condition()
+        self.worker = None
+        self.worker_pid = None
+        self.closed = False
+        atexit.register(self.close)
+
+    def enqueue(self, item_id, fields=None, increments=None, collection_id=None):
+        """
+        Queues a partial update of an item.
+
+        :param item_id: The ID of the item to update.
+        :param fields: A dict of field names to their new values.
+        :param increments: A dict of numeric field names to the amount to add.
+        :param collection_id: The collection of the item, CandidateData by default.
+        """
+        key = (collection_id or self.wix_db.candidateData_collection_id, item_id)
+        update = {'fields': dict(fields or {}), 'increments': dict(increments or {}), 'attempts': 0, 'not_before': 0}
+        with self.condition:
+            closed = self.closed
+            if not closed:
+                self.pending[key] = self._merge(self.pending.get(key), update)
+                self._ensure_worker()
+                if len(self.pending) >= self.max_batch:
+                    self.condition.notify()
+        if closed:
+            # Too late for the worker, write through instead
+            self._write_now(key, update)
+
+    def flush(self):
+        """
+        Sends every pending update now, including ones waiting for a retry.
+        """
+        with self.condition:
+            batch, self.pending = self.pending, {}
+        if batch:
+            self._send(batch, final=False)
+
+    def close(self):
+        """
+        Stops the worker and writes out everything still pending. Registered with atexit.
+        """
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify()
+        if self.worker is not None and self.worker_pid == os.getpid():
+            self.worker.join(timeout=self.flush_interval * 2)
+        with self.condition:
+            batch, self.pending = self.pending, {}
+        if batch:
+            self._send(batch, final=True)
+
+    def count(self):
+        with self.condition:
+            return len(self.pending)
+
+    def _merge(self, older, newer):
+        if older is None:
+            return newer
+        fields = dict(older['fields'])
+        increments = dict(older['increments'])
+        for field_name, value in newer['fields'].items():
+            fields[field_name] = value
+            increments.pop(field_name, None)
+        for field_name, amount in newer['increments'].items():
+            if field_name in fields and isinstance(fields[field_name], (int, float)):
+                fields[field_name] += amount
+            else:
+                increments[field_name] = increments.get(field_name, 0) + amount
+        return {'fields': fields, 'increments': increments,
+                'attempts': older['attempts'], 'not_before': older['not_before']}
+
+    def _ensure_worker(self):
+        # Started lazily, and again after a fork, since threads do not survive into the child
+        if self.worker is None or self.worker_pid != os.getpid() or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name='wix-write-queue', daemon=True)
+            self.worker_pid = os.getpid()
+            self.worker.start()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.closed:
+                    self.condition.wait(timeout=self.flush_interval)
+                if self.closed:
+                    return
+                now = time.monotonic()
+                due = {key: update for key, update in self.pending.items() if update['not_before'] <= now}
+                for key in due:
+                    del self.pending[key]
+            if due:
+                self._send(due, final=False)
+
+    def _send(self, batch, final):
+        with self.app.app_context():
+            by_collection = {}
+            for (collection_id, item_id), update in batch.items():
+                by_collection.setdefault(collection_id, {})[item_id] = update
+
+            for collection_id, updates in by_collection.items():
+                item_ids = list(updates)
+                for start in range(0, len(item_ids), self.max_batch):
+                    chunk = {item_id: updates[item_id] for item_id in item_ids[start:start + self.max_batch]}
+                    try:
+                        updated, rejected = self.wix_db.bulk_patch_items(
+                            {item_id: (update['fields'], update['increments']) for item_id, update in chunk.items()},
+                            collection_id=collection_id
+                        )
+                    except Exception as e:
+                        self.app.logger.error(f"Error flushing Wix writes for {collection_id}: {str(e)}")
+                        updated, rejected = set(), set()
+                    for item_id, update in chunk.items():
+                        if item_id in updated:
+                            continue
+                        if item_id not in rejected:
+                            update = self._without_increments((collection_id, item_id), update)
+                            if update is None:
+                                continue
+                        self._retry((collection_id, item_id), update, final)
+
+    def _without_increments(self, key, update):
+        # The update may have been applied, so only what is safe to send twice goes out again
+        if update['increments']:
+            self.app.logger.error(f"Not retrying increments of item {key[1]} in {key[0]}, whose update may have been "
+                                  f"applied: {update['increments']}")
+        if not update['fields']:
+            return None
+        return dict(update, increments={})
+
+    def _retry(self, key, update, final):
+        update['attempts'] += 1
+        if final or self.closed or update['attempts'] >= self.max_attempts - 1:
+            self._write_now(key, update)
+            return
+        # Exponential backoff with full jitter, capped at 30 seconds
+        delay = random.uniform(0, min(30, self.flush_interval * 2 ** update['attempts']))
+        update['not_before'] = time.monotonic() + delay
+        with self.condition:
+            # Anything queued for the item meanwhile is newer, so it is applied on top
+            self.pending[key] = self._merge(update, self.pending[key]) if key in self.pending else update
+
+    def _write_now(self, key, update):
+        collection_id, item_id = key
+        with self.app.app_context():
+            try:
+                result = self.wix_db.patch_item(item_id, fields=update['fields'], increments=update['increments'],
+                                                collection_id=collection_id)
+            except Exception as e:
+                self.app.logger.error(f"Error writing item {item_id} in {collection_id}: {str(e)}")
+                result = None
+            if result is None:
+                self.app.logger.error(f"Dropping update of item {item_id} in {collection_id} after "
+                                      f"{update['attempts']} attempts: {update['fields']} {update['increments']}")